@@ -0,0 +1,254 @@
+import json
+import random
+import threading
+import time
+import uuid
+
+import click
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+# Ответы в тех форматах, которые разбирает приложение: JSON для эссе и речи, "Score: N" для диагностики,
+# Thought/Action/Final Answer для агента
+ESSAY_RESULT = {
+    "scores": {
+        "task_achievement": 6,
+        "coherence_and_cohesion": 6.5,
+        "lexical_resource": 6,
+        "grammatical_range_and_accuracy": 5.5,
+        "overall": 6,
+    },
+    "improvements": [
+        {"text": "Many people think", "suggestion": "It is widely believed"},
+        {"text": "very important", "suggestion": "crucial"},
+    ],
+    "recommendations": "Develop each main idea with a specific example and vary sentence structures.",
+    "topic_relevance": "The essay addresses the topic but the conclusion is underdeveloped.",
+}
+SPEECH_RESULT = {
+    "scores": {"fluency": 6, "pronunciation": 6.5, "vocabulary": 6, "grammar": 5.5, "overall": 6},
+    "feedback": [{"aspect": "fluency", "comment": "Some hesitation between ideas."}],
+    "recommendations": "Practise extending answers with reasons and examples.",
+    "topic_relevance": "The response stays on topic.",
+}
+TRANSCRIPT = (
+    "I would like to talk about a park near my home. I usually go there at the weekend with my friends "
+    "because it is quiet and there are a lot of trees. We walk around the lake and sometimes have a picnic."
+)
+MINI_TEST = """Passage: Many cities are investing in cycling lanes to reduce traffic and pollution.
+
+Questions:
+1. Why are cities building cycling lanes?
+a) To reduce traffic
+b) To increase parking
+c) To attract tourists"""
+
+
+def chat_reply(prompt):
+    if "examiner" in prompt:
+        return json.dumps(ESSAY_RESULT)
+    if "IELTS Speaking response based on the given topic" in prompt:
+        return json.dumps(SPEECH_RESULT)
+    if prompt.startswith("Evaluate the following"):
+        return "Score: 6.5\nThe response is generally clear with some errors in complex structures."
+    if "Generate a short IELTS" in prompt:
+        return MINI_TEST
+    return "Focus on timed reading practice and review vocabulary for common academic topics."
+
+
+def completion_reply(prompt):
+    # Первый шаг агента вызывает инструмент, после наблюдения - финальный ответ
+    if "Observation:" in prompt:
+        return " I have enough information to provide a response to the student\nFinal Answer: Practise one timed reading passage a day and review the mistakes."
+    return " The student asks for study advice\nAction: Recommendation\nAction Input: reading practice"
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class FakeOpenAI:
+    def __init__(self, chat_latency=0.8, tts_latency=0.4, transcription_latency=1.0, jitter=0.25,
+                 failure_rate=0.0, rate_limit_rate=0.0, stream_chunks=20, seed=None):
+        self.latency = {"chat": chat_latency, "completions": chat_latency, "tts": tts_latency,
+                        "transcription": transcription_latency}
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def delay(self, endpoint):
+        # Задержка с равномерным разбросом ±jitter вокруг среднего значения
+        with self._lock:
+            factor = 1 + self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency[endpoint] * factor)
+
+    def count(self, endpoint, outcome):
+        with self._lock:
+            self.calls[(endpoint, outcome)] = self.calls.get((endpoint, outcome), 0) + 1
+
+    def injected_error(self, endpoint):
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.count(endpoint, "rate_limited")
+            response = jsonify({"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_error"}})
+            response.status_code = 429
+            response.headers["retry-after-ms"] = "200"
+            return response
+        if roll < self.rate_limit_rate + self.failure_rate:
+            self.count(endpoint, "failed")
+            response = jsonify({"error": {"message": "Server error (injected)", "type": "server_error"}})
+            response.status_code = 500
+            return response
+        self.count(endpoint, "ok")
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {f"{endpoint}:{outcome}": count for (endpoint, outcome), count in sorted(self.calls.items())}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+
+def stream_response(chunks, total_delay, make_chunk):
+    # Первый фрагмент приходит через половину задержки, остальные равномерно за вторую половину
+    def events():
+        time.sleep(total_delay / 2)
+        for chunk in chunks:
+            yield f"data: {json.dumps(make_chunk(chunk))}\n\n"
+            time.sleep(total_delay / 2 / max(len(chunks), 1))
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype="text/event-stream")
+
+
+def split_text(text, parts):
+    size = max(1, -(-len(text) // parts))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def create_app(fake):
+    app = Flask(__name__)
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        error = fake.injected_error("chat")
+        if error is not None:
+            return error
+        body = request.get_json()
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        text = chat_reply(prompt)
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            return stream_response(split_text(text, fake.stream_chunks), fake.delay("chat"), lambda chunk: {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+            })
+        time.sleep(fake.delay("chat"))
+        return jsonify({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(text),
+                      "total_tokens": estimate_tokens(prompt) + estimate_tokens(text)},
+        })
+
+    @app.route("/v1/completions", methods=["POST"])
+    def completions():
+        error = fake.injected_error("completions")
+        if error is not None:
+            return error
+        body = request.get_json()
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        texts = [completion_reply(prompt) for prompt in prompts]
+        created = int(time.time())
+        completion_id = f"cmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            return stream_response(split_text(texts[0], fake.stream_chunks), fake.delay("completions"), lambda chunk: {
+                "id": completion_id, "object": "text_completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "text": chunk, "logprobs": None, "finish_reason": None}],
+            })
+        time.sleep(fake.delay("completions"))
+        prompt_tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+        completion_tokens = sum(estimate_tokens(text) for text in texts)
+        return jsonify({
+            "id": completion_id, "object": "text_completion", "created": created, "model": body["model"],
+            "choices": [{"index": index, "text": text, "logprobs": None, "finish_reason": "stop"}
+                        for index, text in enumerate(texts)],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    @app.route("/v1/audio/speech", methods=["POST"])
+    def speech():
+        error = fake.injected_error("tts")
+        if error is not None:
+            return error
+        body = request.get_json()
+        time.sleep(fake.delay("tts"))
+        # Примерно 1 КБ на 16 символов - порядок размера mp3 у tts-1
+        return Response(b"\xff\xfb\x90\x00" + b"\x00" * (len(body["input"]) * 64), mimetype="audio/mpeg")
+
+    @app.route("/v1/audio/transcriptions", methods=["POST"])
+    def transcriptions():
+        error = fake.injected_error("transcription")
+        if error is not None:
+            return error
+        # Загрузка читается целиком, как это делает настоящий API
+        request.files.get("file")
+        time.sleep(fake.delay("transcription"))
+        return jsonify({"text": TRANSCRIPT})
+
+    @app.route("/stats")
+    def stats():
+        return jsonify(fake.stats())
+
+    return app
+
+
+class FakeOpenAIServer:
+    # Сервер в фоновом потоке; base_url передаётся приложению через OPENAI_BASE_URL
+    def __init__(self, fake, host="127.0.0.1", port=0):
+        self.fake = fake
+        self.server = make_server(host, port, create_app(fake), threaded=True)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.server.port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8001, show_default=True)
+@click.option("--chat-latency", default=0.8, show_default=True, help="Mean seconds per chat or completion call.")
+@click.option("--tts-latency", default=0.4, show_default=True, help="Mean seconds per TTS call.")
+@click.option("--transcription-latency", default=1.0, show_default=True, help="Mean seconds per transcription.")
+@click.option("--jitter", default=0.25, show_default=True, help="Relative spread of latencies.")
+@click.option("--failure-rate", default=0.0, show_default=True, help="Share of calls answered with 500.")
+@click.option("--rate-limit-rate", default=0.0, show_default=True, help="Share of calls answered with 429.")
+@click.option("--seed", type=int, default=None, help="Seed for latencies and injected failures.")
+def main(host, port, chat_latency, tts_latency, transcription_latency, jitter, failure_rate, rate_limit_rate, seed):
+    """Serve a local stand-in for the OpenAI chat, completion, TTS and transcription endpoints."""
+    fake = FakeOpenAI(chat_latency, tts_latency, transcription_latency, jitter, failure_rate, rate_limit_rate, seed=seed)
+    server = FakeOpenAIServer(fake, host, port)
+    click.echo(f"Fake OpenAI API on {server.base_url}")
+    server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
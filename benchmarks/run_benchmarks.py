@@ -0,0 +1,354 @@
+import io
+import json
+import logging
+import math
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import httpx
+import numpy as np
+
+from fake_openai import FakeOpenAI, FakeOpenAIServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ESSAY_SENTENCES = [
+    "Living in a large city gives young people access to better jobs and universities.",
+    "However, the cost of housing in the capital has risen faster than salaries.",
+    "Public transport reduces traffic, although many commuters still prefer their cars.",
+    "For example, cycling lanes in Copenhagen encourage residents to leave their vehicles at home.",
+    "Governments should therefore invest in affordable homes near business districts.",
+    "Rural areas, on the other hand, offer cleaner air and a slower pace of life.",
+    "Some experts argue that remote work will make the choice of location less important.",
+    "Moreover, cultural events and museums are concentrated in metropolitan regions.",
+    "Noise and pollution remain serious problems that harm the health of citizens.",
+    "In addition, overcrowded schools struggle to give every child enough attention.",
+    "Technology allows farmers and small businesses to reach customers across the country.",
+    "Consequently, the gap between urban and rural incomes may narrow in the future.",
+    "Local authorities ought to protect green spaces when approving new developments.",
+    "Nevertheless, many families move to suburbs once they have children.",
+    "In conclusion, both lifestyles have clear benefits, and the best option depends on personal priorities.",
+]
+WRITING_TOPICS = [
+    "The advantages and disadvantages of living in a big city",
+    "The role of government in providing affordable housing",
+]
+# Частые запросы, которые роутер обслуживает одним вызовом модели без агента
+ROUTED_INPUTS = [
+    "How can I improve my reading score?",
+    "Give me advice for the listening section",
+    "What should I study this week?",
+    "Give me a mini test on vocabulary",
+]
+# Открытые вопросы, которые роутер передаёт агенту
+AGENT_INPUTS = [
+    "Explain why my writing score is lower than my reading score",
+    "What is the difference between Task 1 and Task 2 in the writing section?",
+    "Compare the academic and general training reading tests",
+]
+
+
+def make_essay(rng, topic=None):
+    # Эссе начинается с пересказа темы, иначе оно может быть отсеяно локально как написанное не по теме
+    sentences = rng.sample(ESSAY_SENTENCES, k=12)
+    if topic:
+        sentences.insert(0, f"This essay considers {topic[0].lower()}{topic[1:]}.")
+    return " ".join(sentences)
+
+
+def make_wav(seconds=3.0, rate=16000):
+    # Синусоида 220 Гц - распознаётся как речь проверкой на тишину
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        frames = (int(8000 * math.sin(2 * math.pi * 220 * i / rate)) for i in range(int(seconds * rate)))
+        f.writeframes(b"".join(struct.pack("<h", frame) for frame in frames))
+    return buffer.getvalue()
+
+
+SPEECH_WAV = make_wav()
+
+
+def check(response):
+    response.raise_for_status()
+    return response
+
+
+def writing_flow(client, rng):
+    topic = rng.choice(WRITING_TOPICS)
+    check(client.post("/api/analyze_writing", json={"essay": make_essay(rng, topic), "task_type": 2, "topic": topic}))
+
+
+def speaking_flow(client, rng):
+    check(client.post(
+        "/api/analyze_speaking",
+        data={"topic": "Describe a place you like to visit in your free time"},
+        files={"audio": ("answer.wav", SPEECH_WAV, "audio/wav")}
+    ))
+
+
+def listening_flow(client, rng):
+    test = check(client.get("/api/get_listening_test")).json()
+    answers = {str(q["id"]): rng.choice(q.get("options") or ["A"]) for q in test["questions"]}
+    check(client.post("/api/check_listening_answers", json={"answers": answers, "test_id": test.get("id")}))
+
+
+def routed_flow(client, rng):
+    check(client.post("/api/analyze", json={"input": rng.choice(ROUTED_INPUTS)}))
+
+
+def agent_flow(client, rng):
+    check(client.post("/api/analyze", json={"input": rng.choice(AGENT_INPUTS)}))
+
+
+def diagnostics_flow(client, rng):
+    # Reading по фиксированному тесту, адаптивный Listening до остановки и Writing с оценкой моделью
+    test = check(client.get("/api/get_diagnostic_test/reading")).json()
+    item_ids = [q["id"] for q in test["questions"]]
+    check(client.post("/api/evaluate_diagnostic_test/reading", data={
+        "answers": json.dumps([rng.choice(q.get("options") or ["A"]) for q in test["questions"]]),
+        "test_id": test["id"], "item_ids": json.dumps(item_ids),
+    }))
+    step = check(client.post("/api/adaptive/listening/start")).json()
+    while not step["finished"]:
+        question = step["item"]["question"]
+        step = check(client.post("/api/adaptive/listening/answer", json={
+            "item_id": question["id"], "answer": rng.choice(question.get("options") or ["A"])
+        })).json()
+    check(client.post("/api/evaluate_diagnostic_test/writing", data={"answers": json.dumps([make_essay(rng)])}))
+
+
+FLOWS = {
+    "writing": writing_flow,
+    "speaking": speaking_flow,
+    "listening": listening_flow,
+    "routed": routed_flow,
+    "agent": agent_flow,
+    "diagnostics": diagnostics_flow,
+}
+# Доли сценариев в смешанной нагрузке
+MIX = {"writing": 30, "listening": 25, "diagnostics": 15, "speaking": 15, "routed": 10, "agent": 5}
+
+
+def mix_flow(client, rng):
+    name = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+    FLOWS[name](client, rng)
+
+
+FLOWS["mix"] = mix_flow
+
+
+def read_memory(pid):
+    # Текущий и пиковый RSS процесса приложения в МБ (Linux)
+    if pid is None:
+        return None, None
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return None, None
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+def run_scenario(base_url, name, users, requests, duration, seed):
+    # Каждый виртуальный пользователь - отдельный клиент со своей cookie-сессией
+    flow = FLOWS[name]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def next_request():
+        with lock:
+            if deadline is None and issued[0] >= requests:
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            issued[0] += 1
+            return True
+
+    def user(index):
+        rng = random.Random(f"{seed}-{name}-{index}")
+        with httpx.Client(base_url=base_url, timeout=300) as client:
+            while next_request():
+                started = time.perf_counter()
+                try:
+                    flow(client, rng)
+                    error = None
+                except Exception as e:
+                    error = f"{e.__class__.__name__}: {e}"
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if error:
+                        errors.append(error)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(user, range(users)))
+    wall = time.perf_counter() - started
+    percentiles = np.percentile(latencies, [50, 95, 99]) if latencies else [math.nan] * 3
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "sample_errors": sorted(set(errors))[:3],
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": float(percentiles[0]),
+        "p95": float(percentiles[1]),
+        "p99": float(percentiles[2]),
+        "wall_seconds": wall,
+    }
+
+
+def start_app(port, openai_base_url, workdir, response_cache):
+    env = dict(
+        os.environ,
+        FLASK_APP="ielts_preparation_app/main.py",
+        OPENAI_API_KEY="benchmark",
+        OPENAI_BASE_URL=openai_base_url,
+        OPENAI_API_BASE=openai_base_url,
+        RESPONSE_CACHE_BACKEND=response_cache,
+        JOB_DB_PATH=os.path.join(workdir, "jobs.sqlite3"),
+        PROGRESS_DB_PATH=os.path.join(workdir, "progress.sqlite3"),
+        SESSION_DB_PATH=os.path.join(workdir, "sessions.sqlite3"),
+        AUDIO_CACHE_DIR=os.path.join(workdir, "audio_cache"),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "run", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f"App exited during startup:\n{process.stderr.read().decode()}")
+        try:
+            httpx.get(f"{base_url}/", timeout=1)
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException("App did not start within 60 seconds")
+
+
+def compare(results, baseline, tolerance):
+    # Регрессия - p95 выше базового больше чем на tolerance или пропускная способность ниже
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if result["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95']:.3f}s vs baseline {base['p95']:.3f}s")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']:.2f}/s vs baseline {base['throughput']:.2f}/s")
+    return regressions
+
+
+def format_table(results):
+    header = f"{'scenario':<12} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'rss MB':>8} {'peak MB':>8}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        rss = f"{r['rss_mb']:.0f}" if r.get("rss_mb") is not None else "-"
+        peak = f"{r['peak_rss_mb']:.0f}" if r.get("peak_rss_mb") is not None else "-"
+        lines.append(
+            f"{name:<12} {r['requests']:>6} {r['errors']:>6} {r['throughput']:>8.2f} "
+            f"{r['p50']:>8.3f} {r['p95']:>8.3f} {r['p99']:>8.3f} {rss:>8} {peak:>8}"
+        )
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option("--scenario", "scenarios", multiple=True, type=click.Choice(sorted(FLOWS)),
+              help="Scenario to run; repeat for several. Defaults to all.")
+@click.option("--users", default=8, show_default=True, help="Concurrent virtual users.")
+@click.option("--requests", default=50, show_default=True, help="Flows per scenario.")
+@click.option("--duration", type=float, default=None, help="Run each scenario for this many seconds instead.")
+@click.option("--warmup", default=2, show_default=True, help="Untimed flows per scenario before measuring.")
+@click.option("--app-url", default=None, help="Benchmark an already running app instead of starting one.")
+@click.option("--app-pid", type=int, default=None, help="PID of the running app, for memory figures.")
+@click.option("--app-port", default=5055, show_default=True)
+@click.option("--response-cache", default="none", show_default=True, help="RESPONSE_CACHE_BACKEND for the started app.")
+@click.option("--chat-latency", default=0.8, show_default=True)
+@click.option("--tts-latency", default=0.4, show_default=True)
+@click.option("--transcription-latency", default=1.0, show_default=True)
+@click.option("--failure-rate", default=0.0, show_default=True)
+@click.option("--rate-limit-rate", default=0.0, show_default=True)
+@click.option("--seed", default=1, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Write results as JSON.")
+@click.option("--baseline", type=click.File("r"), default=None, help="JSON results to compare against.")
+@click.option("--tolerance", default=0.2, show_default=True, help="Allowed relative slowdown against the baseline.")
+def main(scenarios, users, requests, duration, warmup, app_url, app_pid, app_port, response_cache, chat_latency,
+         tts_latency, transcription_latency, failure_rate, rate_limit_rate, seed, output, baseline, tolerance):
+    """Load-test the app against a local fake OpenAI API and report latency, throughput and memory."""
+    scenarios = scenarios or ("writing", "speaking", "listening", "routed", "agent", "diagnostics", "mix")
+    fake = FakeOpenAI(chat_latency, tts_latency, transcription_latency, failure_rate=failure_rate,
+                      rate_limit_rate=rate_limit_rate, seed=seed)
+    server = None
+    process = None
+    workdir = tempfile.mkdtemp(prefix="ielts-bench-")
+    try:
+        if app_url is None:
+            # Журнал каждого запроса к поддельному API заглушил бы отчёт
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            server = FakeOpenAIServer(fake).start()
+            process, app_url = start_app(app_port, server.base_url, workdir, response_cache)
+            app_pid = process.pid
+        results = {}
+        for name in scenarios:
+            if warmup:
+                run_scenario(app_url, name, min(users, warmup), warmup, None, f"{seed}-warmup")
+            fake.reset()
+            result = run_scenario(app_url, name, users, requests, duration, seed)
+            result["rss_mb"], result["peak_rss_mb"] = read_memory(app_pid)
+            if server is not None:
+                result["upstream_calls"] = fake.stats()
+            results[name] = result
+            click.echo(f"{name}: {result['requests']} flows, {result['errors']} errors, p95 {result['p95']:.3f}s", err=True)
+            for error in result["sample_errors"]:
+                click.echo(f"  {error}", err=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        if server is not None:
+            server.stop()
+
+    click.echo(format_table(results))
+    report = {
+        "config": {
+            "users": users, "requests": requests, "duration": duration, "response_cache": response_cache,
+            "chat_latency": chat_latency, "tts_latency": tts_latency, "transcription_latency": transcription_latency,
+            "failure_rate": failure_rate, "rate_limit_rate": rate_limit_rate, "seed": seed,
+        },
+        "scenarios": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    if baseline:
+        regressions = compare(results, json.load(baseline), tolerance)
+        for regression in regressions:
+            click.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
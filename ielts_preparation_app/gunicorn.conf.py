@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import signal
+import time
+
+# Запуск: gunicorn -c gunicorn.conf.py main:app (из каталога приложения или с путём к этому файлу)
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+# Процессы используют все ядра; потоки обслуживают запросы, которые ждут модель, TTS или Whisper
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+
+# Приложение загружается в мастере: банк вопросов, манифест аудио и адаптивные тесты читаются один раз
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# SSE-потоки и ответы модели длятся долго; запрос не прерывается раньше дедлайна вызова OpenAI
+timeout = int(os.getenv("GUNICORN_TIMEOUT", int(float(os.getenv("OPENAI_TIMEOUT", 60))) + 60))
+# При остановке воркер дорабатывает текущие запросы и задачи в течение этого времени
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", int(float(os.getenv("OPENAI_TIMEOUT", 60))) + 30))
+keepalive = 5
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+# Переменные окружения читаются модулями приложения при импорте, поэтому задаются до загрузки main.
+# LRU-кэш сессий в памяти у каждого процесса свой и отдавал бы устаревшие данные; при одном воркере он безопасен
+if workers > 1:
+    os.environ.setdefault("SESSION_CACHE_SIZE", "0")
+os.environ.setdefault("CLEAR_SESSION_ON_START", "0")
+
+
+def when_ready(server):
+    # Мастер, до запуска воркеров: прерванные прошлым запуском задачи возвращаются в очередь один раз
+    import main
+    main.job_queue.recover()
+    tests = main.preload_shared_data()
+    server.log.info(f"Preloaded {tests} test(s); starting {workers} worker(s) x {threads} thread(s)")
+
+
+def post_worker_init(worker):
+    # Потоки не переживают fork, поэтому очередь задач и очистка кэша аудио запускаются в каждом воркере
+    import main
+    main.start_background_workers(recover_jobs=False)
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        # SIGTERM: воркер перестаёт брать новые задачи и сообщает /readyz о выводе, пока дорабатывает запросы
+        worker.drain_started = time.monotonic()
+        main.draining.set()
+        main.job_queue.drain()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_exit(server, worker):
+    # Текущие задачи дорабатывают, пока мастер не завершит воркер принудительно; остальные возвращаются в очередь
+    import main
+    elapsed = time.monotonic() - getattr(worker, "drain_started", time.monotonic())
+    main.stop_background_workers(timeout=max(graceful_timeout - elapsed - 5, 1))
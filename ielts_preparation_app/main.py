@@ -1,16 +1,125 @@
-from flask import Flask, render_template, request, jsonify, send_file, session
-from utils import listening, reading, writing, speaking, diagnostics
-from utils.langchain_utils import use_ielts_agent
-from utils.common import generate_audio
+from flask import Flask, render_template, request, jsonify, send_file, session, Response, stream_with_context, abort, g
+from utils import listening, reading, writing, speaking, diagnostics, agent_router
+from utils.common import generate_audio, resolve_audio, audio_cache, audio_manifest, response_cache, tts_executor, AUDIO_SWEEP_INTERVAL
+from utils.question_bank import question_bank
+from utils.adaptive import choose_adaptive_test, get_adaptive_test
+from utils.agent_budget import AgentBudget
+from utils.jobs import JobQueue, PRIORITY_DIAGNOSTIC
+from utils.audio_processing import AudioRejected
+from utils.session_store import create_session_interface
+from utils.progress_store import ProgressStore
+from utils.scoring import score_batch, attempt_error
+from utils.metrics import registry as metrics_registry, REQUEST_SECONDS, count_error, log_timing
+from werkzeug.datastructures import FileStorage
+import io
 import os
 import json
-from datetime import datetime
+import click
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Добавьте это для работы с сессиями
+# Ограничение размера запроса, чтобы загрузки аудио не разрастались без предела
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_BYTES", 32 * 1024 * 1024))
+# За nginx/Apache отдачу аудио можно переложить на веб-сервер через X-Sendfile
+app.config['USE_X_SENDFILE'] = os.getenv("USE_X_SENDFILE", "0") == "1"
+AUDIO_MAX_AGE = 365 * 24 * 60 * 60
+
+# Данные сессии хранятся на сервере, в cookie - только идентификатор (SESSION_BACKEND=cookie возвращает стандартные сессии Flask)
+session_interface = create_session_interface(
+    os.getenv("SESSION_BACKEND", "sqlite"),
+    app.root_path,
+    cache_size=int(os.getenv("SESSION_CACHE_SIZE", 1000))
+)
+if session_interface:
+    app.session_interface = session_interface
+
+# Очередь фоновых задач для оценки эссе и речи; хранится в SQLite и переживает перезапуск
+job_queue = JobQueue(
+    os.getenv("JOB_DB_PATH", os.path.join(app.root_path, "jobs.sqlite3")),
+    workers=int(os.getenv("JOB_WORKERS", 4))
+)
+
+# История прогресса хранится отдельно от сессии: индекс по пользователю и дате, выборка по диапазону
+progress_store = ProgressStore(os.getenv("PROGRESS_DB_PATH", os.path.join(app.root_path, "progress.sqlite3")))
+PROGRESS_PAGE_SIZE = 100
+PROGRESS_MAX_PAGE_SIZE = 1000
+
+# Сколько ждать завершения текущих задач при остановке процесса
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 60))
+# Устанавливается при остановке: /readyz начинает отвечать 503, новые задачи не берутся
+draining = threading.Event()
+
+def preload_shared_data():
+    # Данные только для чтения; под gunicorn с preload загружаются в мастере и разделяются воркерами после fork
+    tests = question_bank.preload()
+    audio_manifest.data
+    for skill in ('listening', 'reading'):
+        test_id = choose_adaptive_test(skill)
+        if test_id:
+            get_adaptive_test(test_id)
+    return tests
+
+# Под gunicorn фоновые службы запускаются в каждом воркере после fork (recover_jobs=False - задачи
+# восстанавливает мастер один раз); в dev-сервере - при первом запросе
+@app.before_first_request
+def start_background_workers(recover_jobs=True):
+    job_queue.start(recover=recover_jobs)
+    audio_cache.start_sweeper(AUDIO_SWEEP_INTERVAL)
+
+def stop_background_workers(timeout=SHUTDOWN_TIMEOUT):
+    draining.set()
+    unfinished = job_queue.stop(timeout)
+    if unfinished:
+        print(f"Returned {len(unfinished)} unfinished job(s) to the queue")
+    audio_cache.stop_sweeper()
+    tts_executor.shutdown(wait=True)
+
+# Очистка сессии при первом запросе - поведение dev-сервера; с несколькими воркерами
+# каждый из них очистил бы сессию случайного пользователя, поэтому gunicorn её отключает
+CLEAR_SESSION_ON_START = os.getenv("CLEAR_SESSION_ON_START", "1") == "1"
 
 # Флаг для отслеживания первого запроса
-first_request = True
+first_request = CLEAR_SESSION_ON_START
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Для потоковых ответов (SSE, JSON Lines) учитывается время до начала отдачи
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        # Шаблон маршрута, а не путь: /audio/<audio_id> не порождает метку на каждый файл
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+        log_timing('request', elapsed, route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def count_request_errors(error):
+    if error is not None:
+        count_error('route')
+
+@app.errorhandler(AudioRejected)
+def audio_rejected(error):
+    return jsonify({"error": str(error)}), error.status
 
 @app.before_request
 def clear_session_on_first_request():
@@ -19,6 +128,24 @@ def clear_session_on_first_request():
         session.clear()
         first_request = False
 
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    checks = {"accepting": not draining.is_set(), "jobs": job_queue.alive()}
+    try:
+        checks["question_bank"] = bool(question_bank.indexes["tests"])
+        job_queue.counts()
+        checks["database"] = True
+    except Exception as e:
+        print(f"Readiness check failed: {e}")
+        checks.setdefault("question_bank", False)
+        checks["database"] = False
+    ready = all(checks.values())
+    return jsonify({"status": "ready" if ready else "unavailable", "checks": checks}), 200 if ready else 503
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -53,14 +180,58 @@ def get_writing_topic():
     topic = writing.get_writing_topic(custom_topic)
     return jsonify({"topic": topic})
 
+# Маршруты, ожидающие ответа модели, асинхронные и используют асинхронный клиент OpenAI
+def essay_request():
+    # (essay, task_type, topic, ошибка) из JSON-тела; эссе проверяется до подсчёта признаков и обращения к модели
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, None, None, "Expected a JSON object with essay, task_type and topic"
+    essay, task_type, topic = data.get('essay'), data.get('task_type'), data.get('topic')
+    return essay, task_type, topic, writing.essay_input_error(essay, task_type, topic)
+
 @app.route('/api/analyze_writing', methods=['POST'])
 def analyze_writing():
-    essay = request.json['essay']
-    task_type = request.json['task_type']
-    topic = request.json['topic']
+    essay, task_type, topic, error = essay_request()
+    if error:
+        return jsonify({"error": error}), 400
     result = writing.analyze_essay(essay, task_type, topic)
     return jsonify(result)
 
+@app.route('/api/analyze_writing/stream', methods=['POST'])
+def analyze_writing_stream():
+    essay, task_type, topic, error = essay_request()
+    if error:
+        return jsonify({"error": error}), 400
+
+    def events():
+        for event, data in writing.stream_essay_analysis(essay, task_type, topic):
+            if event == 'result' and data is None:
+                yield sse_event('error', {"error": "Failed to analyze essay"})
+            else:
+                yield sse_event(event, data)
+
+    return sse_response(events())
+
+@app.route('/api/analyze_writing/batch', methods=['POST'])
+def analyze_writing_batch():
+    # Принимает JSON-массив или JSON Lines, отвечает потоком JSON Lines
+    if request.mimetype == 'application/x-ndjson':
+        try:
+            records = writing.parse_json_lines(request.get_data(as_text=True).splitlines())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a list of essays"}), 400
+    max_workers = request.args.get('max_workers', writing.BATCH_MAX_WORKERS, type=int)
+
+    def lines():
+        for item in writing.analyze_essays(records, max_workers):
+            yield json.dumps(item) + "\n"
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
 @app.route('/api/get_speaking_topic', methods=['GET'])
 def get_speaking_topic():
     custom_topic = request.args.get('custom_topic')
@@ -92,9 +263,9 @@ def get_listening_test():
 @app.route('/api/check_listening_answers', methods=['POST'])
 def check_listening_answers():
     user_answers = request.json['answers']
-    result = listening.check_answers(user_answers)
-    test = listening.LISTENING_TESTS[0]  # Предполагаем, что это текущий тест
-    listening.cleanup_audio_files(test)
+    result = listening.check_answers(user_answers, request.json.get('test_id'), request.json.get('item_ids'))
+    if result is None:
+        return jsonify({"error": "Unknown test"}), 404
     return jsonify(result)
 
 @app.route('/api/get_reading_test', methods=['GET'])
@@ -105,9 +276,23 @@ def get_reading_test():
 @app.route('/api/check_reading_answers', methods=['POST'])
 def check_reading_answers():
     user_answers = request.json['answers']
-    result = reading.check_answers(user_answers)
+    result = reading.check_answers(user_answers, request.json.get('test_id'), request.json.get('item_ids'))
+    if result is None:
+        return jsonify({"error": "Unknown test"}), 404
     return jsonify(result)
 
+@app.route('/api/check_answers/batch', methods=['POST'])
+def check_answers_batch():
+    # Принимает список попыток {test_id, answers[, item_ids]} и оценивает их пакетно
+    attempts = request.get_json(silent=True)
+    if not isinstance(attempts, list):
+        return jsonify({"error": "Expected a list of attempts"}), 400
+    for index, attempt in enumerate(attempts):
+        error = attempt_error(attempt)
+        if error:
+            return jsonify({"error": f"Attempt {index}: {error}", "index": index}), 400
+    return jsonify({"results": score_batch(attempts)})
+
 @app.route('/api/get_diagnostic_test/<skill>')
 def get_diagnostic_test(skill):
     test = diagnostics.get_diagnostic_test(skill)
@@ -122,18 +307,57 @@ def evaluate_diagnostic_test(skill):
         result = diagnostics.evaluate_diagnostic_test(skill, [audio_file])
     else:
         answers = json.loads(request.form['answers'])
-        result = diagnostics.evaluate_diagnostic_test(skill, answers)
+        result = diagnostics.evaluate_diagnostic_test(skill, answers, *diagnostic_attempt(request.form))
     
     if result is None:
         return jsonify({"error": "Failed to evaluate the test"}), 500
     
+    store_temp_diagnostic_result(skill, result)
+    return jsonify({"score": result})
+
+@app.route('/api/adaptive/<skill>/start', methods=['POST'])
+def start_adaptive_test(skill):
+    state = diagnostics.start_adaptive_test(skill)
+    if state is None:
+        return jsonify({"error": f"No adaptive test for {skill}"}), 404
+    session['adaptive'] = {**session.get('adaptive', {}), skill: state}
+    item = diagnostics.get_adaptive_item(skill, state['test_id'], state['pending'])
+    if item is None:
+        return jsonify({"error": "Item not found"}), 404
+    return jsonify({"finished": False, "items_answered": 0, "item": item})
+
+@app.route('/api/adaptive/<skill>/answer', methods=['POST'])
+def answer_adaptive_test(skill):
+    state = session.get('adaptive', {}).get(skill)
+    if state is None or state['pending'] is None:
+        return jsonify({"error": "No adaptive test in progress"}), 400
+    item_id = request.json.get('item_id')
+    if item_id is None:
+        return jsonify({"error": "item_id is required"}), 400
+    item_id = str(item_id)
+    if item_id != state['pending']:
+        return jsonify({"error": "Unexpected item"}), 400
+    result = diagnostics.answer_adaptive_test(skill, state, item_id, request.json.get('answer'))
+    session['adaptive'] = {**session.get('adaptive', {}), skill: state}
+    if result['finished']:
+        store_temp_diagnostic_result(skill, result['score'])
+    else:
+        result['item'] = diagnostics.get_adaptive_item(skill, state['test_id'], state['pending'])
+        if result['item'] is None:
+            return jsonify({"error": "Item not found"}), 404
+    return jsonify(result)
+
+def diagnostic_attempt(form):
+    # Тест и показанные вопросы передаёт клиент, поэтому проверка не зависит от состояния сервера
+    item_ids = form.get('item_ids')
+    return form.get('test_id'), json.loads(item_ids) if item_ids else None
+
+def store_temp_diagnostic_result(skill, result):
     # Сохраняем результат во временном хранилище сессии
     if 'temp_diagnostic_results' not in session:
         session['temp_diagnostic_results'] = {}
     session['temp_diagnostic_results'][skill] = result
     session.modified = True  # Явно отмечаем сессию как измененную
-    
-    return jsonify({"score": result})
 
 @app.route('/api/save_diagnostic_results', methods=['POST'])
 def save_diagnostic_results():
@@ -144,12 +368,7 @@ def save_diagnostic_results():
     session['diagnostic_results'] = session['temp_diagnostic_results']
     
     # Добавляем результат в историю прогресса
-    if 'progress_history' not in session:
-        session['progress_history'] = []
-    session['progress_history'].append({
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        **session['diagnostic_results']
-    })
+    progress_store.add(progress_user_id(), datetime.now().strftime("%Y-%m-%d"), session['diagnostic_results'])
     
     # Очищаем временное хранилище
     session.pop('temp_diagnostic_results', None)
@@ -169,24 +388,54 @@ def analyze():
     if 'history' not in session:
         session['history'] = []
     history = session['history']
-    final_answer, mini_test, listening_text = use_ielts_agent(input_text, history)
+    # Частые запросы (мини-тест, рекомендации) обслуживаются без агента; langchain загружается только для остальных
+    budget = AgentBudget()
+    final_answer, mini_test, listening_text = agent_router.answer(input_text, history, budget)
     history.append({"role": "user", "content": input_text})
     history.append({"role": "assistant", "content": final_answer})
     session['history'] = history[-10:]  # Сохраняем только последние 10 сообщений
     
+    # Генерируем аудио только для текста прослушивания
+    audio_file = generate_audio(listening_text) if listening_text else None
+    response_data = build_analyze_response(final_answer, mini_test, listening_text, audio_file)
+    response_data["budget"] = budget.report()
+    return jsonify(response_data)
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    input_text = request.json['input']
+    history = session.get('history', [])
+    session['history'] = (history + [{"role": "user", "content": input_text}])[-10:]
+    budget = AgentBudget()
+
+    def events():
+        for event, data in agent_router.stream_answer(input_text, history, budget):
+            if event == 'result':
+                final_answer, mini_test, listening_text = data
+                audio_file = generate_audio(listening_text) if listening_text else None
+                data = build_analyze_response(final_answer, mini_test, listening_text, audio_file)
+                data["budget"] = budget.report()
+                # Заголовки уже отправлены, поэтому ответ ассистента записывается в серверную сессию напрямую;
+                # с cookie-сессиями в истории остаётся только вопрос пользователя
+                if session_interface:
+                    session['history'] = (session['history'] + [{"role": "assistant", "content": final_answer}])[-10:]
+                    session_interface.persist(app, session)
+            yield sse_event(event, data)
+
+    return sse_response(events())
+
+def build_analyze_response(final_answer, mini_test, listening_text, audio_file):
     response_data = {"result": final_answer}
     
     if mini_test:
         response_data["mini_test"] = mini_test
     
     if listening_text:
-        # Генерируем аудио только для текста прослушивания
-        audio_file = generate_audio(listening_text)
         if audio_file:
             response_data["audio_url"] = f"/audio/{audio_file}"
         response_data["listening_text"] = listening_text
     
-    return jsonify(response_data)
+    return response_data
 
 @app.route('/api/save_target_skills', methods=['POST'])
 def save_target_skills():
@@ -197,6 +446,27 @@ def save_target_skills():
     session.modified = True
     return jsonify({"message": "Target skills saved successfully"})
 
+def progress_user_id():
+    if 'user_id' not in session:
+        session['user_id'] = uuid.uuid4().hex
+    user_id = session['user_id']
+    # История, накопленная в сессии до появления хранилища, переносится в него один раз
+    for entry in session.pop('progress_history', []):
+        progress_store.add(user_id, entry.get('date', datetime.now().strftime("%Y-%m-%d")), entry)
+    return user_id
+
+def progress_history():
+    # По умолчанию - последние 90 дней; клиент может запросить диапазон, агрегацию и следующую страницу
+    start = request.args.get('from') or (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+    end = request.args.get('to')
+    bucket = request.args.get('bucket')
+    if bucket not in (None, 'day', 'week'):
+        bucket = None
+    limit = min(max(request.args.get('limit', PROGRESS_PAGE_SIZE, type=int), 1), PROGRESS_MAX_PAGE_SIZE)
+    return progress_store.query(
+        progress_user_id(), start, end, bucket=bucket, limit=limit, cursor=request.args.get('cursor')
+    )
+
 @app.route('/api/get_progress', methods=['GET'])
 def get_progress():
     if 'diagnostic_results' not in session or not session['diagnostic_results']:
@@ -219,9 +489,14 @@ def get_progress():
         })
     else:
         # Если есть сохраненные результаты, возвращаем их
+        try:
+            history, next_cursor = progress_history()
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         return jsonify({
             "current": session['diagnostic_results'],
-            "history": session.get('progress_history', []),
+            "history": history,
+            "next_cursor": next_cursor,
             "targets": session.get('targets', {
                 "listening": 7.0,
                 "reading": 7.0,
@@ -230,9 +505,152 @@ def get_progress():
             })
         })
 
-@app.route('/audio/<path:filename>')
-def serve_audio(filename):
-    return send_file(filename, mimetype='audio/mpeg')
+def uploaded_audio(payload, blob):
+    return FileStorage(io.BytesIO(blob), filename=payload['filename'], content_type=payload.get('content_type'))
+
+def run_writing_job(payload, blob):
+    return writing.analyze_essay(payload['essay'], payload['task_type'], payload['topic'])
+
+def run_speaking_job(payload, blob):
+    return speaking.analyze_speech(uploaded_audio(payload, blob), payload['topic'])
+
+def run_diagnostic_job(payload, blob):
+    skill = payload['skill']
+    answers = [uploaded_audio(payload, blob)] if skill == 'speaking' else payload['answers']
+    score = diagnostics.evaluate_diagnostic_test(skill, answers, payload.get('test_id'), payload.get('item_ids'))
+    return None if score is None else {"skill": skill, "score": score}
+
+job_queue.register('analyze_writing', run_writing_job)
+job_queue.register('analyze_speaking', run_speaking_job)
+job_queue.register('evaluate_diagnostic_test', run_diagnostic_job)
+
+def job_accepted(job_id):
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+@app.route('/api/jobs/analyze_writing', methods=['POST'])
+def submit_writing_job():
+    essay, task_type, topic, error = essay_request()
+    if error:
+        return jsonify({"error": error}), 400
+    payload = {"essay": essay, "task_type": task_type, "topic": topic}
+    return job_accepted(job_queue.submit('analyze_writing', payload))
+
+@app.route('/api/jobs/analyze_speaking', methods=['POST'])
+def submit_speaking_job():
+    if 'audio' not in request.files:
+        return jsonify({"error": "No audio file provided"}), 400
+    audio_file = request.files['audio']
+    if audio_file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+    payload = {"topic": request.form['topic'], "filename": audio_file.filename, "content_type": audio_file.content_type}
+    return job_accepted(job_queue.submit('analyze_speaking', payload, blob=audio_file.read()))
+
+@app.route('/api/jobs/evaluate_diagnostic_test/<skill>', methods=['POST'])
+def submit_diagnostic_job(skill):
+    payload = {"skill": skill}
+    blob = None
+    if skill == 'speaking':
+        if 'audio' not in request.files:
+            return jsonify({"error": "No audio file provided"}), 400
+        audio_file = request.files['audio']
+        payload.update(filename=audio_file.filename, content_type=audio_file.content_type)
+        blob = audio_file.read()
+    else:
+        payload['answers'] = json.loads(request.form['answers'])
+        payload['test_id'], payload['item_ids'] = diagnostic_attempt(request.form)
+    # Диагностика обрабатывается раньше практических заданий
+    return job_accepted(job_queue.submit('evaluate_diagnostic_test', payload, blob=blob, priority=PRIORITY_DIAGNOSTIC))
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['kind'] == 'evaluate_diagnostic_test' and job['status'] == 'done':
+        store_temp_diagnostic_result(job['result']['skill'], job['result']['score'])
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        current = job
+        yield sse_event('status', current)
+        while current['status'] not in ('done', 'failed'):
+            current = job_queue.wait(job_id, timeout=15)
+            if current is None:
+                # Задача удалена (например, при очистке старых результатов)
+                yield sse_event('error', {"job_id": job_id, "error": "Job not found"})
+                return
+            if current['status'] in ('done', 'failed'):
+                break
+            # Комментарий SSE поддерживает соединение, пока задача в очереди
+            yield ": keep-alive\n\n"
+        yield sse_event(current['status'], current)
+
+    return sse_response(events())
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "audio": audio_cache.stats(),
+        "responses": response_cache.stats() if response_cache else None
+    })
+
+@app.route('/api/agent_stats', methods=['GET'])
+def agent_stats():
+    return jsonify({**loaded_agent_stats(), "router": agent_router.get_router_stats()})
+
+# Статистика кэшей, очереди и агента уже ведётся в своих объектах и снимается в момент опроса /metrics
+def cache_lookups():
+    stats = {"audio": audio_cache.stats(), "responses": response_cache.stats() if response_cache else None}
+    return {(cache, result): values[field] for cache, values in stats.items() if values
+            for result, field in (("hit", "hits"), ("miss", "misses"))}
+
+def cache_entries():
+    audio = audio_cache.stats()
+    values = {("audio", "entries"): audio["entries"], ("audio", "bytes"): audio["bytes"]}
+    if response_cache:
+        values[("responses", "entries")] = response_cache.stats()["entries"]
+    return values
+
+def loaded_agent_stats():
+    # Пока агент не понадобился, langchain не загружен и статистика нулевая
+    if 'utils.langchain_utils' not in sys.modules:
+        return {"build_seconds": 0.0, "builds": 0, "reuses": 0, "setup_seconds_saved": 0.0}
+    return sys.modules['utils.langchain_utils'].get_agent_stats()
+
+def agent_builds():
+    stats = loaded_agent_stats()
+    return {("build",): stats["builds"], ("reuse",): stats["reuses"]}
+
+metrics_registry.callback(
+    "ielts_cache_lookups_total", "Response and audio cache lookups.", "counter", ("cache", "result"), cache_lookups
+)
+metrics_registry.callback("ielts_cache_size", "Current cache size.", "gauge", ("cache", "unit"), cache_entries)
+metrics_registry.callback("ielts_jobs", "Background jobs by kind and status.", "gauge", ("kind", "status"), job_queue.counts)
+metrics_registry.callback(
+    "ielts_agent_executor_total", "Agent executor builds and reuses.", "counter", ("event",), agent_builds
+)
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/audio/<audio_id>')
+def serve_audio(audio_id):
+    path = resolve_audio(audio_id)
+    if path is None:
+        abort(404)
+    # Содержимое файла определяется его идентификатором и не меняется, поэтому он же служит ETag
+    # (mtime меняется при обращениях к кэшу); conditional=True включает If-None-Match и Range для перемотки
+    response = send_file(path, mimetype='audio/mpeg', conditional=True, etag=audio_id, max_age=AUDIO_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/api/check_mini_test', methods=['POST'])
 def check_mini_test():
@@ -258,5 +676,56 @@ def extract_mini_test(result):
             formatted_test["questions"][-1]["options"].append(q[2:].strip())
     return formatted_test
 
+@app.cli.command('prerender-audio')
+@click.option('--voice', default='alloy', help='TTS voice used for the static tests.')
+@click.option('--prune', is_flag=True, help='Remove previously rendered versions.')
+def prerender_audio_command(voice, prune):
+    """Render audio for all static listening content and publish a manifest."""
+    from utils.prerender import prerender_audio
+    prerender_audio(voice=voice, prune=prune, log=click.echo)
+
+@app.cli.command('index-question-bank')
+def index_question_bank_command():
+    """Rebuild the question bank index from the test files."""
+    from utils.question_bank import question_bank
+    count = question_bank.write_index()
+    click.echo(f"Indexed {count} test(s) in {question_bank.index_path}")
+
+@app.cli.command('import-report')
+@click.option('--top', default=15, show_default=True, help='Number of packages and modules to list.')
+@click.option('--budget-ms', type=float, default=None, help='Fail if importing the app takes longer.')
+def import_report_command(top, budget_ms):
+    """Report how long importing the app takes, per package and per module."""
+    from utils.import_report import measure_imports, summarize_imports
+    entries = measure_imports('main')
+    total, packages = summarize_imports(entries, 'main')
+    click.echo(f"Importing main: {total:.0f} ms")
+    click.echo("\nBy package (self time):")
+    for package, self_ms in packages[:top]:
+        click.echo(f"  {self_ms:8.1f} ms  {package}")
+    click.echo("\nSlowest modules (including their imports):")
+    for entry in sorted(entries, key=lambda entry: entry['cumulative_ms'], reverse=True)[:top]:
+        click.echo(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+    if budget_ms is not None and total > budget_ms:
+        raise click.ClickException(f"Import time {total:.0f} ms exceeds the budget of {budget_ms:.0f} ms")
+
+@app.cli.command('grade-essays')
+@click.argument('input_file', type=click.File('r'))
+@click.argument('output_file', type=click.File('w'), default='-')
+@click.option('--workers', default=writing.BATCH_MAX_WORKERS, show_default=True, help='Essays scored in parallel.')
+def grade_essays_command(input_file, output_file, workers):
+    """Score essays from a JSON Lines file of {essay, task_type, topic[, id]} records."""
+    try:
+        records = writing.parse_json_lines(input_file)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    failed = 0
+    for item in writing.analyze_essays(records, workers):
+        failed += 'error' in item
+        output_file.write(json.dumps(item) + "\n")
+        output_file.flush()
+    click.echo(f"Scored {len(records) - failed} of {len(records)} essay(s)", err=True)
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Только для разработки; в продакшене - gunicorn -c gunicorn.conf.py main:app
+    app.run(debug=os.getenv("FLASK_DEBUG", "1") == "1")
@@ -5,6 +5,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const diagnosticButton = document.getElementById('diagnostic-button');
     const saveTargetsButton = document.getElementById('save-targets');
     let radarChart, lineChart;
+    const PROGRESS_WINDOW_DAYS = 180;
 
     submitButton.addEventListener('click', sendMessage);
     userInput.addEventListener('keypress', function(e) {
@@ -25,20 +26,29 @@ document.addEventListener('DOMContentLoaded', function() {
             addMessageToChat('You', message);
             userInput.value = '';
 
-            fetch('/api/analyze', {
+            const status = addMessageToChat('Assistant', 'Thinking...');
+
+            fetch('/api/analyze/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({input: message}),
             })
-            .then(response => response.json())
-            .then(data => {
-                addMessageToChat('Assistant', data.result);
-                updateProgress();
-            })
+            .then(response => readEventStream(response, function(event, data) {
+                if (event === 'action') {
+                    status.innerHTML = `<strong>Assistant:</strong> Using ${data.tool}...`;
+                } else if (event === 'result') {
+                    status.remove();
+                    addMessageToChat('Assistant', data.result);
+                    updateProgress();
+                } else if (event === 'error') {
+                    throw new Error(data);
+                }
+            }))
             .catch((error) => {
                 console.error('Error:', error);
+                status.remove();
                 addMessageToChat('Assistant', 'Sorry, an error occurred. Please try again.');
             });
         }
@@ -50,11 +60,26 @@ document.addEventListener('DOMContentLoaded', function() {
         messageElement.innerHTML = `<strong>${sender}:</strong> ${message}`;
         chatMessages.appendChild(messageElement);
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageElement;
     }
 
     function updateProgress() {
-        fetch('/api/get_progress')
-            .then(response => response.json())
+        // Запрашиваем только то окно истории, которое показывает график, по одной точке на день
+        // (окно включает сегодняшний день); если точек всё же больше страницы, дочитываем по next_cursor
+        const from = new Date(Date.now() - PROGRESS_WINDOW_DAYS * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
+        const url = `/api/get_progress?from=${from}&bucket=day&limit=${PROGRESS_WINDOW_DAYS + 1}`;
+
+        function fetchPage(cursor, history) {
+            return fetch(cursor ? `${url}&cursor=${encodeURIComponent(cursor)}` : url)
+                .then(response => response.json())
+                .then(data => {
+                    data.history = history.concat(data.history || []);
+                    // Каждая страница содержит current и targets, поэтому возвращается последняя
+                    return data.next_cursor ? fetchPage(data.next_cursor, data.history) : data;
+                });
+        }
+
+        fetchPage(null, [])
             .then(data => {
                 updateRadarChart(data.current, data.targets);
                 updateLineChart(data.history);
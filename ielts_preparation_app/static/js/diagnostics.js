@@ -1,16 +1,27 @@
 let currentSkill = '';
+let currentTest = null;
 let diagnosticResults = {};
 let mediaRecorder;
 let audioChunks = [];
 
+// Listening и Reading проходят адаптивно: по одному заданию, пока оценка не станет устойчивой
+const ADAPTIVE_SKILLS = ['listening', 'reading'];
+
 function startDiagnosticTest(skill) {
     currentSkill = skill;
+    if (ADAPTIVE_SKILLS.includes(skill)) {
+        fetch(`/api/adaptive/${skill}/start`, { method: 'POST' })
+            .then(response => response.json())
+            .then(data => displayAdaptiveItem(data));
+        return;
+    }
     fetch(`/api/get_diagnostic_test/${skill}`)
         .then(response => response.json())
         .then(data => displayDiagnosticTest(data));
 }
 
 function displayDiagnosticTest(data) {
+    currentTest = data;
     let testHtml = `<h2>${currentSkill.charAt(0).toUpperCase() + currentSkill.slice(1)} Diagnostic Test</h2>`;
     
     if (currentSkill === 'reading') {
@@ -19,7 +30,7 @@ function displayDiagnosticTest(data) {
             testHtml += createQuestionHtml(q, index);
         });
     } else if (currentSkill === 'listening') {
-        data.forEach((q, index) => {
+        data.questions.forEach((q, index) => {
             testHtml += createQuestionHtml(q, index);
         });
     } else if (currentSkill === 'speaking') {
@@ -44,6 +55,40 @@ function displayDiagnosticTest(data) {
     }
 }
 
+function displayAdaptiveItem(data) {
+    currentTest = data.item;
+    let testHtml = `<h2>${currentSkill.charAt(0).toUpperCase() + currentSkill.slice(1)} Diagnostic Test</h2>`;
+    testHtml += `<p>Question ${data.items_answered + 1}</p>`;
+    if (data.item.passage) {
+        testHtml += `<div class="passage">${data.item.passage}</div>`;
+    }
+    testHtml += createQuestionHtml(data.item.question, data.items_answered);
+    testHtml += `<button onclick="submitAdaptiveAnswer()">Next</button>`;
+    document.getElementById('diagnostic-test').innerHTML = testHtml;
+}
+
+function submitAdaptiveAnswer() {
+    const input = document.querySelector('.question input[type="radio"]:checked');
+    fetch(`/api/adaptive/${currentSkill}/answer`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ item_id: currentTest.question.id, answer: input ? input.value : null })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.finished) {
+            diagnosticResults[currentSkill] = data.score;
+            displayDiagnosticResult(data.score);
+        } else {
+            displayAdaptiveItem(data);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        displayDiagnosticResult('Error');
+    });
+}
+
 function createQuestionHtml(q, index) {
     let questionHtml = `<div class="question">`;
     if (q.audio_url) {
@@ -112,6 +157,11 @@ function submitDiagnosticTest() {
     } else {
         formData.append('answers', JSON.stringify(answers));
     }
+    if (currentSkill === 'listening' || currentSkill === 'reading') {
+        // Сервер проверяет ответы по id теста и показанных вопросов
+        formData.append('test_id', currentTest.id);
+        formData.append('item_ids', JSON.stringify(currentTest.questions.map(q => q.id)));
+    }
 
     fetch(`/api/evaluate_diagnostic_test/${currentSkill}`, {
         method: 'POST',
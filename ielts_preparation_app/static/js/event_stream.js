@@ -0,0 +1,32 @@
+// Читает ответ text/event-stream и вызывает onEvent(event, data) для каждого события
+function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    function read() {
+        return reader.read().then(({done, value}) => {
+            if (done) {
+                return;
+            }
+            buffer += decoder.decode(value, {stream: true});
+            const messages = buffer.split('\n\n');
+            buffer = messages.pop();
+            messages.forEach(message => {
+                let event = 'message';
+                let data = '';
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        event = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        data += line.slice(6);
+                    }
+                });
+                onEvent(event, JSON.parse(data));
+            });
+            return read();
+        });
+    }
+
+    return read();
+}
@@ -43,7 +43,11 @@ document.addEventListener('DOMContentLoaded', function() {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({answers: userAnswers}),
+            body: JSON.stringify({
+                test_id: currentTest.id,
+                item_ids: currentTest.questions.map(question => question.id),
+                answers: userAnswers
+            }),
         })
         .then(response => response.json())
         .then(data => {
@@ -51,6 +55,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 <h2>Results</h2>
                 <p>Score: ${data.score}/${data.total}</p>
                 <p>Percentage: ${data.percentage.toFixed(2)}%</p>
+                ${data.band !== undefined ? `<p>Estimated band: ${data.band.toFixed(1)}</p>` : ''}
             `;
         });
     });
@@ -37,7 +37,10 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
-        fetch('/api/analyze_writing', {
+        results.innerHTML = '<h2>Analyzing...</h2><pre id="analysis-progress"></pre>';
+        const progress = document.getElementById('analysis-progress');
+
+        fetch('/api/analyze_writing/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -48,24 +51,36 @@ document.addEventListener('DOMContentLoaded', function() {
                 topic: currentTopic
             }),
         })
-        .then(response => response.json())
-        .then(data => {
-            let resultsHtml = '<h2>Analysis Results</h2>';
-            resultsHtml += '<h3>Scores:</h3>';
-            for (const [criterion, score] of Object.entries(data.scores)) {
-                resultsHtml += `<p>${criterion.replace('_', ' ')}: ${score}</p>`;
+        .then(response => readEventStream(response, function(event, data) {
+            if (event === 'token') {
+                progress.textContent += data;
+            } else if (event === 'result') {
+                showResults(data);
+            } else if (event === 'error') {
+                throw new Error(data.error);
             }
-            resultsHtml += '<h3>Improvements:</h3>';
-            data.improvements.forEach((improvement, index) => {
-                resultsHtml += `<p>${index + 1}. ${improvement.text}<br>Suggestion: ${improvement.suggestion}</p>`;
-            });
-            resultsHtml += `<h3>Recommendations:</h3><p>${data.recommendations}</p>`;
-            resultsHtml += `<h3>Topic Relevance:</h3><p>${data.topic_relevance}</p>`;
-            results.innerHTML = resultsHtml;
-        })
+        }))
         .catch((error) => {
             console.error('Error:', error);
             results.innerHTML = '<p>An error occurred while analyzing the essay. Please try again.</p>';
         });
     });
+
+    function showResults(data) {
+        let resultsHtml = '<h2>Analysis Results</h2>';
+        if (data.features) {
+            resultsHtml += `<p>Words: ${data.features.word_count} (minimum ${data.features.min_words}), sentences: ${data.features.sentence_count}, linking words: ${data.features.connectives}</p>`;
+        }
+        resultsHtml += '<h3>Scores:</h3>';
+        for (const [criterion, score] of Object.entries(data.scores)) {
+            resultsHtml += `<p>${criterion.replace('_', ' ')}: ${score}</p>`;
+        }
+        resultsHtml += '<h3>Improvements:</h3>';
+        data.improvements.forEach((improvement, index) => {
+            resultsHtml += `<p>${index + 1}. ${improvement.text}<br>Suggestion: ${improvement.suggestion}</p>`;
+        });
+        resultsHtml += `<h3>Recommendations:</h3><p>${data.recommendations}</p>`;
+        resultsHtml += `<h3>Topic Relevance:</h3><p>${data.topic_relevance}</p>`;
+        results.innerHTML = resultsHtml;
+    }
 });
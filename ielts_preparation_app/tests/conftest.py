@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Модули приложения импортируются как utils.*, так же как из main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import adaptive, scoring
+from utils.question_bank import QuestionBank
+
+
+def make_test(test_id, skill, answers, section="practice", irt=None):
+    # Тест банка вопросов: answers - {id вопроса: ответ}, irt - {id вопроса: (a, b, c)}
+    questions = []
+    for question_id, answer in answers.items():
+        question = {"id": question_id, "question": f"Question {question_id}", "options": ["A", "B", "C"],
+                    "answer": answer}
+        if irt and question_id in irt:
+            a, b, c = irt[question_id]
+            question["irt"] = {"a": a, "b": b, "c": c}
+        questions.append(question)
+    return {"id": test_id, "skill": skill, "section": section, "questions": questions}
+
+
+@pytest.fixture
+def make_bank(tmp_path, monkeypatch):
+    # Банк вопросов во временном каталоге подменяет общий банк в модулях, которые его используют
+    def make(*tests):
+        directory = tmp_path / "question_bank"
+        (directory / "tests").mkdir(parents=True, exist_ok=True)
+        for test in tests:
+            (directory / "tests" / f"{test['id']}.json").write_text(json.dumps(test), encoding="utf-8")
+        bank = QuestionBank(str(directory))
+        bank.write_index()
+        for module in (scoring, adaptive):
+            monkeypatch.setattr(module, "question_bank", bank)
+        monkeypatch.setattr(adaptive, "_engines", {})
+        return bank
+    return make
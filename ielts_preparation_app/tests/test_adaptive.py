@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from conftest import make_test
+from utils import adaptive
+from utils.adaptive import AdaptiveTest, choose_adaptive_test, get_adaptive_test
+
+
+def synthetic_pool(size=200, seed=0):
+    # Пул 3PL: дискриминация 0.8-2.0, трудность равномерно от -3 до 3, угадывание 0.2
+    rng = np.random.default_rng(seed)
+    return {
+        f"q{index}": [float(rng.uniform(0.8, 2.0)), float(b), 0.2]
+        for index, b in enumerate(np.linspace(-3, 3, size))
+    }
+
+
+def probability(parameters, theta):
+    a, b, c = parameters
+    return c + (1 - c) / (1 + np.exp(-1.7 * a * (theta - b)))
+
+
+def run_test(engine, true_theta, seed):
+    rng = np.random.default_rng(seed)
+    parameters = synthetic_pool()
+    state = engine.start()
+    while not engine.finished(state):
+        item_id = engine.next_item(state)
+        engine.update(state, item_id, rng.random() < probability(parameters[item_id], true_theta))
+    return state
+
+
+def test_prior_estimate():
+    engine = AdaptiveTest("t", synthetic_pool())
+    theta, se = engine.estimate(engine.start())
+    assert theta == pytest.approx(0.0, abs=1e-9)
+    assert se == pytest.approx(1.0, abs=0.01)
+
+
+def test_update_moves_estimate_and_narrows_posterior():
+    engine = AdaptiveTest("t", {"easy": [1.0, -1.0, 0.0], "hard": [1.0, 1.0, 0.0]})
+    right = engine.update(engine.start(), "hard", True)
+    wrong = engine.update(engine.start(), "easy", False)
+    assert engine.estimate(right)[0] > 0 > engine.estimate(wrong)[0]
+    assert engine.estimate(right)[1] < 1.0
+    assert right["administered"] == ["hard"] and right["responses"] == [1]
+    # Апостериорное распределение хранится нормированным по максимуму
+    assert max(right["log_posterior"]) == 0.0
+
+
+def test_next_item_is_most_informative_at_estimate():
+    engine = AdaptiveTest("t", {"low": [1.0, -2.0, 0.0], "mid": [1.0, 0.1, 0.0], "high": [1.0, 2.0, 0.0]})
+    state = engine.start()
+    assert engine.next_item(state) == "mid"
+    # После верного ответа оценка выше нуля - ближе к трудному заданию, чем к лёгкому
+    engine.update(state, "mid", True)
+    assert engine.next_item(state) == "high"
+    engine.update(state, "high", True)
+    assert engine.next_item(state) == "low"
+    engine.update(state, "low", True)
+    assert engine.next_item(state) is None
+
+
+def test_next_item_prefers_discriminating_items():
+    engine = AdaptiveTest("t", {"flat": [0.5, 0.0, 0.0], "sharp": [2.0, 0.0, 0.0]})
+    assert engine.next_item(engine.start()) == "sharp"
+
+
+def test_finished_by_item_count(monkeypatch):
+    monkeypatch.setattr(adaptive, "CAT_MAX_ITEMS", 3)
+    monkeypatch.setattr(adaptive, "CAT_TARGET_SE", 0.0)
+    engine = AdaptiveTest("t", synthetic_pool())
+    state = engine.start()
+    for _ in range(3):
+        assert not engine.finished(state)
+        engine.update(state, engine.next_item(state), True)
+    assert engine.finished(state)
+
+
+def test_finished_when_pool_is_exhausted(monkeypatch):
+    monkeypatch.setattr(adaptive, "CAT_TARGET_SE", 0.0)
+    engine = AdaptiveTest("t", {"a": [1.0, 0.0, 0.2], "b": [1.0, 1.0, 0.2]})
+    state = engine.start()
+    engine.update(state, "a", True)
+    assert not engine.finished(state)
+    engine.update(state, "b", False)
+    assert engine.finished(state)
+
+
+@pytest.mark.parametrize("true_theta", [-2.0, -0.5, 0.0, 1.0, 2.5])
+def test_converges_on_synthetic_pool(monkeypatch, true_theta):
+    monkeypatch.setattr(adaptive, "CAT_MAX_ITEMS", 60)
+    monkeypatch.setattr(adaptive, "CAT_TARGET_SE", 0.3)
+    engine = AdaptiveTest("t", synthetic_pool())
+    errors = []
+    for seed in range(5):
+        state = run_test(engine, true_theta, seed)
+        theta, se = engine.estimate(state)
+        assert se <= 0.3 or len(state["administered"]) == 60
+        assert len(set(state["administered"])) == len(state["administered"])
+        errors.append(theta - true_theta)
+    # Средняя ошибка по пяти прогонам укладывается в стандартную ошибку одного прогона
+    assert abs(np.mean(errors)) < 0.3
+    assert max(abs(error) for error in errors) < 1.0
+
+
+def test_band_grows_with_ability():
+    engine = AdaptiveTest("t", synthetic_pool())
+    bands = [engine.band("listening", theta) for theta in np.linspace(-4, 4, 17)]
+    assert bands == sorted(bands)
+    assert bands[0] < 5.0 and bands[-1] == 9.0
+
+
+def test_engine_from_question_bank(make_bank):
+    irt = {1: (1.0, -1.0, 0.2), 2: (1.2, 0.5, 0.2)}
+    make_bank(make_test("listening-diagnostic", "listening", {1: "A", 2: "B"}, "diagnostic", irt),
+              make_test("listening-plain", "listening", {1: "A"}, "diagnostic"),
+              make_test("reading-plain", "reading", {1: "A"}, "diagnostic"))
+    assert choose_adaptive_test("listening") == "listening-diagnostic"
+    assert choose_adaptive_test("reading") is None
+    engine = get_adaptive_test("listening-diagnostic")
+    assert engine.item_ids == ["1", "2"]
+    assert get_adaptive_test("listening-diagnostic") is engine
+    assert get_adaptive_test("listening-plain") is None
@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from utils import jobs
+from utils.jobs import PRIORITY_DIAGNOSTIC, JobQueue
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    # Несколько очередей над одной базой изображают процессы-воркеры gunicorn
+    queues = []
+
+    def make(handler=None, workers=1):
+        queue = JobQueue(str(tmp_path / "jobs.sqlite3"), workers=workers, poll_interval=0.01)
+        queue.register("score", handler or (lambda payload, blob: {"value": payload["value"]}))
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop(timeout=1)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def row(queue, job_id):
+    return queue._connection().execute("SELECT status, owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_submit_rejects_unknown_kind(make_queue):
+    with pytest.raises(ValueError):
+        make_queue().submit("unknown", {})
+
+
+def test_claim_order_and_queue_position(make_queue):
+    queue = make_queue()
+    queue.owner = "me"
+    practice = queue.submit("score", {"value": 1})
+    later = queue.submit("score", {"value": 2})
+    diagnostic = queue.submit("score", {"value": 3}, priority=PRIORITY_DIAGNOSTIC)
+    assert [queue.get(job_id)["position"] for job_id in (practice, later, diagnostic)] == [1, 2, 0]
+    assert [queue._claim()[0] for _ in range(3)] == [diagnostic, practice, later]
+    assert queue._claim() is None
+    assert row(queue, practice) == ("running", "me")
+
+
+def test_jobs_run_to_completion(make_queue):
+    def handler(payload, blob):
+        if payload["value"] == "error":
+            raise RuntimeError("broken")
+        return None if payload["value"] == "empty" else {"value": payload["value"], "blob": len(blob or b"")}
+
+    queue = make_queue(handler, workers=2)
+    queue.start()
+    done = queue.submit("score", {"value": 1}, blob=b"abc")
+    empty = queue.submit("score", {"value": "empty"})
+    error = queue.submit("score", {"value": "error"})
+    assert queue.wait(done, timeout=5)["result"] == {"value": 1, "blob": 3}
+    assert queue.wait(empty, timeout=5)["error"] == "Failed to process score job"
+    assert queue.wait(error, timeout=5)["error"] == "broken"
+    assert queue.counts() == {("score", "done"): 1, ("score", "failed"): 2}
+    # Входные данные удаляются после завершения
+    assert queue._connection().execute("SELECT blob FROM jobs WHERE id = ?", (done,)).fetchone() == (None,)
+
+
+def test_finish_requires_ownership(make_queue):
+    queue = make_queue()
+    queue.owner = "me"
+    job_id = queue.submit("score", {"value": 1})
+    queue._claim()
+    queue.owner = "someone-else"
+    queue._finish(job_id, "done", {"value": 1})
+    assert row(queue, job_id) == ("running", "me")
+    queue.owner = "me"
+    queue._finish(job_id, "done", {"value": 1})
+    assert row(queue, job_id) == ("done", "me")
+
+
+def test_stop_requeues_only_owned_jobs(make_queue):
+    release = threading.Event()
+
+    def blocking(name):
+        def handler(payload, blob):
+            release.wait(5)
+            return {"by": name}
+        return handler
+
+    first = make_queue(blocking("first"))
+    second = make_queue(blocking("second"))
+    first.start(recover=False)
+    own = first.submit("score", {})
+    wait_for(lambda: row(first, own)[0] == "running")
+    second.start(recover=False)
+    other = second.submit("score", {})
+    wait_for(lambda: row(second, other)[0] == "running")
+    assert row(first, own)[1] == first.owner and row(second, other)[1] == second.owner
+
+    threads = list(first._threads)
+    assert first.stop(timeout=0.1) == [own]
+    assert row(first, own) == ("queued", None)
+    assert row(second, other) == ("running", second.owner)
+
+    # Поздний результат первого процесса отбрасывается; задачу заново выполняет второй
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert second.wait(other, timeout=5)["result"] == {"by": "second"}
+    assert second.wait(own, timeout=5)["result"] == {"by": "second"}
+
+
+def test_recover_requeues_running_and_drops_old_results(make_queue):
+    queue = make_queue()
+    running = queue.submit("score", {"value": 1})
+    old = queue.submit("score", {"value": 2})
+    recent = queue.submit("score", {"value": 3})
+    conn = queue._connection()
+    conn.execute("UPDATE jobs SET status = 'running', owner = 'gone' WHERE id = ?", (running,))
+    conn.execute("UPDATE jobs SET status = 'done', updated_at = ? WHERE id = ?", (time.time() - queue.retention - 1, old))
+    conn.execute("UPDATE jobs SET status = 'failed' WHERE id = ?", (recent,))
+    queue.recover()
+    assert row(queue, running) == ("queued", None)
+    assert queue.get(old) is None
+    assert queue.get(recent)["status"] == "failed"
+
+
+def test_worker_survives_claim_errors(make_queue, monkeypatch):
+    queue = make_queue()
+    claim = queue._claim
+    failures = []
+
+    def flaky_claim():
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+
+    monkeypatch.setattr(queue, "_claim", flaky_claim)
+    queue.start()
+    job_id = queue.submit("score", {"value": 1})
+    assert queue.wait(job_id, timeout=5)["status"] == "done"
+    assert len(failures) == 2 and queue.alive()
+
+
+def test_result_is_retried_when_database_is_locked(make_queue, monkeypatch):
+    queue = make_queue()
+    finish = queue._finish
+    failures = []
+
+    def flaky_finish(*args, **kwargs):
+        if len(failures) < jobs.FINISH_RETRIES:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return finish(*args, **kwargs)
+
+    monkeypatch.setattr(queue, "_finish", flaky_finish)
+    queue.start()
+    job_id = queue.submit("score", {"value": 1})
+    assert queue.wait(job_id, timeout=10)["result"] == {"value": 1}
+    assert len(failures) == jobs.FINISH_RETRIES
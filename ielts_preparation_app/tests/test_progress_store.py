@@ -0,0 +1,104 @@
+import datetime
+
+import pytest
+
+from utils.progress_store import ProgressStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProgressStore(str(tmp_path / "progress.sqlite3"))
+
+
+def day(offset, start=datetime.date(2026, 1, 5)):
+    # 2026-01-05 - понедельник
+    return (start + datetime.timedelta(days=offset)).isoformat()
+
+
+def all_pages(store, user_id, limit, **kwargs):
+    points, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.query(user_id, limit=limit, cursor=cursor, **kwargs)
+        points += page
+        pages += 1
+        if cursor is None:
+            return points, pages
+
+
+def test_add_keeps_only_numeric_scores(store):
+    store.add("u", day(0), {"listening": 6.5, "reading": "n/a", "writing": None, "speaking": 7})
+    points, cursor = store.query("u")
+    assert points == [{"date": day(0), "listening": 6.5, "reading": None, "writing": None, "speaking": 7.0}]
+    assert cursor is None
+
+
+def test_query_is_per_user_and_in_range(store):
+    for offset in range(10):
+        store.add("u", day(offset), {"listening": offset})
+    store.add("other", day(3), {"listening": 9})
+    points, _ = store.query("u", start=day(2), end=day(4))
+    assert [(point["date"], point["listening"]) for point in points] == [(day(2), 2), (day(3), 3), (day(4), 4)]
+
+
+def test_cursor_pages_across_rows_of_the_same_day(store):
+    # Граница страницы приходится на середину дня с несколькими записями
+    for offset in range(4):
+        for score in (5.0, 6.0, 7.0):
+            store.add("u", day(offset), {"reading": score + offset})
+    first, cursor = store.query("u", limit=5)
+    assert len(first) == 5 and cursor is not None
+    second, _ = store.query("u", limit=5, cursor=cursor)
+    assert (first[-1]["date"], second[0]["date"]) == (day(1), day(1))
+    points, pages = all_pages(store, "u", limit=5)
+    assert pages == 3
+    assert [(point["date"], point["reading"]) for point in points] == [
+        (day(offset), score + offset) for offset in range(4) for score in (5.0, 6.0, 7.0)
+    ]
+
+
+def test_exact_page_has_no_next_cursor(store):
+    for offset in range(4):
+        store.add("u", day(offset), {"reading": 5})
+    points, cursor = store.query("u", limit=4)
+    assert len(points) == 4 and cursor is None
+
+
+def test_day_buckets_average_scores(store):
+    store.add("u", day(0), {"listening": 5, "writing": 6})
+    store.add("u", day(0), {"listening": 6})
+    store.add("u", day(1), {"listening": 7.333333})
+    points, _ = store.query("u", bucket="day")
+    assert points == [
+        {"date": day(0), "listening": 5.5, "reading": None, "writing": 6.0, "speaking": None},
+        {"date": day(1), "listening": 7.33, "reading": None, "writing": None, "speaking": None},
+    ]
+
+
+def test_week_buckets_start_on_monday(store):
+    # Понедельник, воскресенье той же недели и понедельник следующей
+    store.add("u", day(0), {"reading": 5})
+    store.add("u", day(6), {"reading": 7})
+    store.add("u", day(7), {"reading": 8})
+    store.add("u", day(-1), {"reading": 4})
+    points, _ = store.query("u", bucket="week")
+    assert [(point["date"], point["reading"]) for point in points] == [(day(-7), 4), (day(0), 6), (day(7), 8)]
+
+
+@pytest.mark.parametrize("bucket, expected", [("day", 30), ("week", 5)])
+def test_bucket_cursor_pages_across_page_boundary(store, bucket, expected):
+    for offset in range(30):
+        store.add("u", day(offset), {"speaking": 6})
+        store.add("u", day(offset), {"speaking": 7})
+    points, pages = all_pages(store, "u", limit=4, bucket=bucket)
+    assert len(points) == expected
+    assert pages == -(-expected // 4)
+    assert [point["date"] for point in points] == sorted({point["date"] for point in points})
+    assert all(point["speaking"] == 6.5 for point in points)
+
+
+def test_chart_window_fits_in_one_page(store):
+    # Окно графика прогресса: PROGRESS_WINDOW_DAYS + 1 точка, по одной в день
+    for offset in range(181):
+        store.add("u", day(offset), {"listening": 6})
+    points, cursor = store.query("u", start=day(0), end=day(180), bucket="day", limit=181)
+    assert len(points) == 181 and points[-1]["date"] == day(180) and cursor is None
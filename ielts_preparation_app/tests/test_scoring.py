@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from conftest import make_test
+from utils.scoring import BAND_TABLES, RAW_SCORE_MAX, attempt_error, raw_to_band, score_attempt, score_attempts, score_batch
+
+
+@pytest.mark.parametrize("skill, raw, band", [
+    ("listening", 0, 0.0),
+    ("listening", 1, 1.0),
+    ("listening", 3, 2.0),
+    ("listening", 17, 5.0),
+    ("listening", 18, 5.5),
+    ("listening", 22, 5.5),
+    ("listening", 23, 6.0),
+    ("listening", 38, 8.5),
+    ("listening", 39, 9.0),
+    ("listening", 40, 9.0),
+    ("reading", 14, 4.5),
+    ("reading", 15, 5.0),
+    ("reading", 18, 5.0),
+    ("reading", 19, 5.5),
+    ("reading", 29, 6.5),
+    ("reading", 30, 7.0),
+])
+def test_raw_to_band_boundaries(skill, raw, band):
+    assert raw_to_band(skill, raw) == band
+
+
+@pytest.mark.parametrize("skill", sorted(BAND_TABLES))
+def test_raw_to_band_matches_table_for_every_score(skill):
+    # Векторный поиск совпадает с построчным просмотром таблицы
+    def expected(raw):
+        return max((band for minimum, band in BAND_TABLES[skill] if raw >= minimum), default=0.0)
+
+    raws = np.arange(RAW_SCORE_MAX + 1)
+    assert raw_to_band(skill, raws).tolist() == [expected(raw) for raw in raws]
+
+
+@pytest.fixture
+def listening_test(make_bank):
+    make_bank(make_test("listening-1", "listening", {1: "A", 2: "B", 3: "C", 4: "A"}),
+              make_test("writing-1", "writing", {1: "A"}))
+    return "listening-1"
+
+
+def test_score_attempts_all_correct(listening_test):
+    result = score_attempt(listening_test, {"1": "A", "2": "B", "3": "C", "4": "A"})
+    assert result == {"score": 4, "total": 4, "percentage": 100.0, "band": 9.0}
+
+
+def test_score_attempts_counts_only_shown_items(listening_test):
+    # 1 из 2 показанных вопросов - 50%, то есть 20 из 40 по шкале band
+    result = score_attempt(listening_test, {1: "A", 2: "C", 3: "C"}, item_ids=[1, "2"])
+    assert result == {"score": 1, "total": 2, "percentage": 50.0, "band": 5.5}
+
+
+def test_score_attempts_ignores_unknown_items(listening_test):
+    result = score_attempt(listening_test, {"1": "A", "99": "A"}, item_ids=["1", "99"])
+    assert (result["score"], result["total"]) == (1, 1)
+
+
+def test_score_attempts_without_shown_items(listening_test):
+    result = score_attempt(listening_test, {}, item_ids=["99"])
+    assert result == {"score": 0, "total": 0, "percentage": 0.0, "band": 0.0}
+
+
+def test_score_attempts_in_one_batch_keeps_order(listening_test):
+    attempts = [
+        {"answers": {"1": "A", "2": "B", "3": "C", "4": "A"}},
+        {"answers": {}},
+        {"answers": {"1": "A", "2": "B"}},
+    ]
+    assert [result["score"] for result in score_attempts(listening_test, attempts)] == [4, 0, 2]
+
+
+def test_score_attempts_without_band_table(listening_test):
+    assert score_attempt("writing-1", {"1": "A"}) == {"score": 1, "total": 1, "percentage": 100.0}
+
+
+def test_score_attempts_unknown_test(listening_test):
+    assert score_attempts("missing", [{"answers": {}}]) is None
+    assert score_attempt("missing", {}) is None
+
+
+@pytest.mark.parametrize("attempt, error", [
+    ([], "attempt must be an object"),
+    ({"test_id": "missing", "answers": {}}, "Unknown test: missing"),
+    ({"test_id": 1, "answers": {}}, "Unknown test: 1"),
+    ({"test_id": "listening-1", "answers": ["A"]}, "answers must be an object"),
+    ({"test_id": "listening-1", "answers": {}, "item_ids": "1"}, "item_ids must be a list of question ids"),
+    ({"test_id": "listening-1", "answers": {}, "item_ids": [{"id": 1}]}, "item_ids must be a list of question ids"),
+    ({"test_id": "listening-1", "answers": {}, "item_ids": [1, "2"]}, None),
+])
+def test_attempt_error(listening_test, attempt, error):
+    assert attempt_error(attempt) == error
+
+
+def test_score_batch_groups_by_test(listening_test):
+    results = score_batch([
+        {"test_id": "listening-1", "answers": {"1": "A"}, "item_ids": ["1"]},
+        {"test_id": "writing-1", "answers": {"1": "B"}},
+        {"test_id": "listening-1", "answers": {"1": "B"}, "item_ids": ["1"]},
+    ])
+    assert [(result["score"], result["total"]) for result in results] == [(1, 1), (0, 1), (0, 1)]
+    assert "band" not in results[1]
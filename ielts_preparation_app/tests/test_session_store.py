@@ -0,0 +1,154 @@
+import pytest
+from flask import Flask, jsonify, session
+
+from utils import session_store
+from utils.session_store import CachedSessionStore, FileSessionStore, SQLiteSessionStore, ServerSideSessionInterface
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store.time, "time", clock)
+    return clock
+
+
+class RecordingStore(SQLiteSessionStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.writes = []
+        self.deletes = []
+
+    def set(self, sid, data, lifetime):
+        self.writes.append(sid)
+        super().set(sid, data, lifetime)
+
+    def delete(self, sid):
+        self.deletes.append(sid)
+        super().delete(sid)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RecordingStore(str(tmp_path / "sessions.sqlite3"))
+
+
+@pytest.fixture
+def client(store):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = ServerSideSessionInterface(store)
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session["value"] = value
+        return "ok"
+
+    @app.route("/get")
+    def get_value():
+        return jsonify(session.get("value"))
+
+    @app.route("/clear")
+    def clear():
+        session.clear()
+        return "ok"
+
+    return app.test_client()
+
+
+def session_cookie(client):
+    return next((cookie.value for cookie in client.cookie_jar if cookie.name == "session"), None)
+
+
+def test_cookie_holds_only_signed_id(client, store):
+    client.get("/set/secret")
+    cookie = session_cookie(client)
+    assert cookie and "secret" not in cookie
+    sid = cookie.rsplit(".", 1)[0]
+    assert store.writes == [sid]
+    assert '"secret"' in store.get(sid)
+    assert client.get("/get").json == "secret"
+
+
+def test_unmodified_session_is_not_written(client, store):
+    client.get("/get")
+    assert store.writes == [] and session_cookie(client) is None
+    client.get("/set/a")
+    client.get("/get")
+    client.get("/get")
+    assert len(store.writes) == 1
+
+
+def test_modified_session_keeps_its_id(client, store):
+    client.get("/set/a")
+    client.get("/set/b")
+    assert len(store.writes) == 2 and store.writes[0] == store.writes[1]
+    assert client.get("/get").json == "b"
+
+
+def test_cleared_session_is_deleted(client, store):
+    client.get("/set/a")
+    sid = store.writes[0]
+    client.get("/clear")
+    assert store.deletes == [sid]
+    assert store.get(sid) is None
+    assert session_cookie(client) is None
+
+
+def test_tampered_cookie_starts_new_session(client, store):
+    client.get("/set/a")
+    sid = store.writes[0]
+    client.set_cookie("localhost", "session", f"{sid}.forged")
+    assert client.get("/get").json is None
+
+
+def test_expired_session_is_not_loaded(client, store, clock):
+    client.get("/set/a")
+    clock.now += 31 * 24 * 60 * 60 + 1
+    assert client.get("/get").json is None
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    return FileSessionStore(str(tmp_path / "sessions"))
+
+
+def test_store_expiry_and_purge(backend, clock):
+    backend.set("short", "{}", 10)
+    backend.set("long", "{}", 100)
+    clock.now += 10
+    assert backend.get("short") is None
+    assert backend.get("long") == "{}"
+    backend.purge_expired()
+    clock.now -= 10
+    # После очистки запись удалена, а не просто скрыта по времени
+    assert backend.get("short") is None
+    assert backend.get("long") == "{}"
+
+
+def test_cached_store_respects_expiry(backend, clock):
+    store = CachedSessionStore(backend, max_entries=1)
+    store.set("a", "1", 10)
+    assert store.get("a") == "1"
+    clock.now += 11
+    assert store.get("a") is None
+
+
+def test_cached_store_evicts_least_recent(backend, clock):
+    store = CachedSessionStore(backend, max_entries=1)
+    store.set("a", "1", 100)
+    store.set("b", "2", 100)
+    assert list(store._entries) == ["b"]
+    # Вытесненная из кэша запись читается из хранилища
+    assert store.get("a") == "1"
+    store.delete("a")
+    assert store.get("a") is None
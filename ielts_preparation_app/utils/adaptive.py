@@ -0,0 +1,90 @@
+import os
+import threading
+
+import numpy as np
+
+from .question_bank import question_bank
+from .scoring import RAW_SCORE_MAX, raw_to_band
+
+# Сетка способностей для EAP-оценки и таблиц информативности
+THETA_GRID = np.linspace(-4, 4, 81)
+LOG_PRIOR = -0.5 * THETA_GRID ** 2
+
+CAT_MAX_ITEMS = int(os.getenv("CAT_MAX_ITEMS", 20))
+# Тест заканчивается, когда стандартная ошибка оценки опускается до этого значения
+CAT_TARGET_SE = float(os.getenv("CAT_TARGET_SE", 0.4))
+
+
+class AdaptiveTest:
+    # Пул заданий одного теста с параметрами 3PL; вероятности и информация по сетке считаются один раз
+    def __init__(self, test_id, parameters):
+        self.test_id = test_id
+        self.item_ids = list(parameters)
+        a, b, c = (np.array(column, dtype=float)[:, None] for column in zip(*parameters.values()))
+        p = c + (1 - c) / (1 + np.exp(-1.7 * a * (THETA_GRID - b)))
+        self.log_p = np.log(p)
+        self.log_q = np.log(1 - p)
+        self.information = (1.7 * a) ** 2 * ((p - c) / (1 - c)) ** 2 * (1 - p) / p
+        # Ожидаемая доля верных ответов по пулу - переводит способность в первичный балл и band
+        self.expected_score = p.mean(axis=0)
+        self.positions = {item_id: index for index, item_id in enumerate(self.item_ids)}
+
+    def start(self):
+        return {"test_id": self.test_id, "log_posterior": LOG_PRIOR.tolist(), "administered": [], "responses": []}
+
+    def update(self, state, item_id, correct):
+        # Апостериорное распределение обновляется одним слагаемым правдоподобия нового ответа
+        row = self.positions[item_id]
+        log_posterior = np.array(state["log_posterior"]) + (self.log_p[row] if correct else self.log_q[row])
+        state["log_posterior"] = (log_posterior - log_posterior.max()).tolist()
+        state["administered"].append(item_id)
+        state["responses"].append(int(correct))
+        return state
+
+    def estimate(self, state):
+        weights = np.exp(np.array(state["log_posterior"]))
+        weights /= weights.sum()
+        theta = float((weights * THETA_GRID).sum())
+        se = float(np.sqrt((weights * (THETA_GRID - theta) ** 2).sum()))
+        return theta, se
+
+    def next_item(self, state):
+        remaining = [self.positions[item_id] for item_id in self.item_ids if item_id not in state["administered"]]
+        if not remaining:
+            return None
+        theta, _ = self.estimate(state)
+        column = int(np.abs(THETA_GRID - theta).argmin())
+        return self.item_ids[remaining[int(self.information[remaining, column].argmax())]]
+
+    def finished(self, state):
+        if len(state["administered"]) >= min(CAT_MAX_ITEMS, len(self.item_ids)):
+            return True
+        return bool(state["administered"]) and self.estimate(state)[1] <= CAT_TARGET_SE
+
+    def band(self, skill, theta):
+        column = int(np.abs(THETA_GRID - theta).argmin())
+        raw_score = int(round(self.expected_score[column] * RAW_SCORE_MAX))
+        return float(raw_to_band(skill, raw_score))
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_adaptive_test(test_id):
+    engine = _engines.get(test_id)
+    if engine is None:
+        parameters = question_bank.item_parameters(test_id)
+        if not parameters:
+            return None
+        with _engines_lock:
+            engine = _engines.setdefault(test_id, AdaptiveTest(test_id, parameters))
+    return engine
+
+
+def choose_adaptive_test(skill):
+    # Диагностические пулы, у которых есть калиброванные параметры
+    for test_id in question_bank.select(skill, 'diagnostic'):
+        if question_bank.item_parameters(test_id):
+            return test_id
+    return None
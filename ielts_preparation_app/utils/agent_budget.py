@@ -0,0 +1,97 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from .metrics import registry, log_timing
+
+# Лимиты одного запроса к агенту: шаги (каждый - вызов LLM), время и токены LLM агента
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", 4))
+AGENT_MAX_SECONDS = float(os.getenv("AGENT_MAX_SECONDS", 30))
+AGENT_TOKEN_BUDGET = int(os.getenv("AGENT_TOKEN_BUDGET", 4000))
+
+AGENT_ITERATIONS = registry.histogram(
+    "ielts_agent_iterations", "LLM steps per chat request.", ("route", "stopped"), buckets=(1, 2, 3, 4, 6, 8, 12)
+)
+AGENT_RUN_TOKENS = registry.histogram(
+    "ielts_agent_run_tokens", "LLM tokens per chat request, estimated when the model streams.", ("route", "stopped"),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000)
+)
+AGENT_STOPS = registry.counter("ielts_agent_stopped_total", "Agent runs stopped early by a budget.", ("reason",))
+
+# Бюджет текущего запроса; callback-и langchain выполняются в копии контекста и видят тот же объект
+current_budget = contextvars.ContextVar("agent_budget", default=None)
+
+
+class AgentBudget:
+    def __init__(self, max_iterations=AGENT_MAX_ITERATIONS, max_seconds=AGENT_MAX_SECONDS, max_tokens=AGENT_TOKEN_BUDGET):
+        self.max_iterations = max_iterations
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.iterations = 0
+        self.tokens = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self.stopped = None
+        # "agent" или intent, по которому запрос обслужен напрямую
+        self.route = "agent"
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def remaining(self):
+        return max(self.max_seconds - self.elapsed(), 0.0)
+
+    def add_step(self, tokens):
+        # Каждый шаг агента - один вызов LLM
+        self.iterations += 1
+        self.tokens += tokens
+
+    def add_tokens(self, tokens):
+        self.tokens += tokens
+
+    def stop(self, reason):
+        # Первая исчерпанная причина остаётся в отчёте
+        if self.stopped is None:
+            self.stopped = reason
+
+    def should_continue(self, iterations):
+        if iterations >= self.max_iterations:
+            self.stop("iterations")
+        elif self.elapsed() >= self.max_seconds:
+            self.stop("time")
+        elif self.tokens >= self.max_tokens:
+            self.stop("tokens")
+        return self.stopped is None
+
+    def finish(self):
+        self.finished = time.monotonic()
+        stopped = self.stopped or "no"
+        AGENT_ITERATIONS.observe(self.iterations, route=self.route, stopped=stopped)
+        AGENT_RUN_TOKENS.observe(self.tokens, route=self.route, stopped=stopped)
+        if self.stopped:
+            AGENT_STOPS.inc(reason=self.stopped)
+        log_timing("agent_budget", self.elapsed(), route=self.route, iterations=self.iterations, tokens=self.tokens,
+                   stopped=self.stopped)
+
+    def report(self):
+        return {
+            "route": self.route,
+            "iterations": self.iterations,
+            "max_iterations": self.max_iterations,
+            "seconds": round(self.elapsed(), 3),
+            "max_seconds": self.max_seconds,
+            "tokens": self.tokens,
+            "max_tokens": self.max_tokens,
+            "stopped": self.stopped,
+        }
+
+
+@contextmanager
+def use_budget(budget):
+    token = current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        current_budget.reset(token)
+        budget.finish()
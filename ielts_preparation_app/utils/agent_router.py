@@ -0,0 +1,194 @@
+import json
+import re
+import threading
+
+from .common import get_openai_response, stream_openai_response
+from .openai_client import estimate_tokens
+from .metrics import registry
+
+SKILLS = ("reading", "listening", "writing", "speaking", "vocabulary", "grammar")
+SKILL_RE = re.compile(r"\b(" + "|".join(SKILLS) + r")\b")
+
+# Частые однозначные запросы; всё остальное уходит агенту
+MINI_TEST_RE = re.compile(
+    r"\b(mini[- ]?tests?|quiz(?:zes)?|practice (?:tests?|questions?|exercises?)|test me)\b"
+)
+RECOMMENDATION_RE = re.compile(
+    r"\b(recommend\w*|advice|advise|tips?|suggest\w*|study plan)\b"
+    r"|\bwhat should i (?:study|practi[cs]e|focus on|do next)\b"
+    r"|\bhow (?:can|do|should) i improve\b"
+)
+# Длинный ввод (эссе, подробный вопрос) или просьба объяснить - открытый запрос для агента
+OPEN_ENDED_RE = re.compile(r"\b(why|explain|difference|compare|analy[sz]e|check my|correct my)\b")
+ROUTER_MAX_WORDS = 40
+
+# Оценка, а не измерение: агент тратит на запрос с одним инструментом два обращения к LLM -
+# выбор инструмента и финальный ответ
+AGENT_ITERATIONS_PER_TOOL_CALL = 2
+
+router_stats = {"routed": {}, "agent": 0, "iterations_saved_estimate": 0}
+_stats_lock = threading.Lock()
+
+
+def classify_intent(input_text):
+    # Возвращает (intent, аргумент) для запросов, которые обслуживаются без агента, иначе None
+    text = input_text.lower()
+    if len(text.split()) > ROUTER_MAX_WORDS or OPEN_ENDED_RE.search(text):
+        return None
+    if MINI_TEST_RE.search(text):
+        skill = SKILL_RE.search(text)
+        return "mini_test", skill.group(1) if skill else "reading"
+    if RECOMMENDATION_RE.search(text):
+        return "recommendation", None
+    return None
+
+
+def mini_test_prompt(skill):
+    return f"""Generate a short IELTS {skill} mini test with the following format:
+        1. A short passage or context (2-3 sentences)
+        2. 3 multiple-choice questions related to the passage
+
+        Format the output as follows:
+        Passage: [Passage or context]
+
+        Questions:
+        1. [Question 1]
+        a) [Option A]
+        b) [Option B]
+        c) [Option C]
+
+        2. [Question 2]
+        a) [Option A]
+        b) [Option B]
+        c) [Option C]
+
+        3. [Question 3]
+        a) [Option A]
+        b) [Option B]
+        c) [Option C]
+        """
+
+
+def is_mini_test(result):
+    # В кэш попадает только мини-тест, который можно разобрать
+    return "Passage:" in result and "Questions:" in result
+
+
+def recommendation_prompt(history):
+    return f"Based on the following interaction history, provide a personalized IELTS study recommendation:\n\n{history}"
+
+
+def routed_request(intent, argument, input_text, history):
+    # Промпт инструмента, обрамление его ответа так, как это сделал бы агент, и проверка ответа для кэша
+    if intent == "mini_test":
+        return mini_test_prompt(argument), f"Here is a short {argument} mini test for practice.\n\n", is_mini_test
+    conversation = json.dumps(history + [{"role": "user", "content": input_text}])
+    return recommendation_prompt(conversation), "", None
+
+
+def finish_routed(budget, intent, prompt, result):
+    # Прямой ответ - один вызов модели; бюджет закрывается так же, как после агента
+    if budget is None:
+        return
+    budget.route = intent
+    budget.add_step(estimate_tokens(prompt))
+    budget.add_tokens(estimate_tokens(result))
+    budget.finish()
+
+
+def record_route(intent):
+    with _stats_lock:
+        if intent is None:
+            router_stats["agent"] += 1
+        else:
+            router_stats["routed"][intent] = router_stats["routed"].get(intent, 0) + 1
+            router_stats["iterations_saved_estimate"] += AGENT_ITERATIONS_PER_TOOL_CALL
+
+
+def get_router_stats():
+    with _stats_lock:
+        return {**router_stats, "routed": dict(router_stats["routed"])}
+
+
+def route_counts():
+    stats = get_router_stats()
+    return {**{(intent,): count for intent, count in stats["routed"].items()}, ("agent",): stats["agent"]}
+
+
+registry.callback("ielts_agent_routes_total", "Chat requests by route: a direct intent or the agent.", "counter",
+                  ("route",), route_counts)
+registry.callback("ielts_agent_iterations_saved_estimate_total",
+                  "Estimated agent LLM iterations skipped by intent routing, two per routed request.", "counter",
+                  (), lambda: {(): get_router_stats()["iterations_saved_estimate"]})
+
+
+def answer(input_text, history, budget=None):
+    intent = classify_intent(input_text)
+    if intent is not None:
+        prompt, prefix, validate = routed_request(*intent, input_text, history)
+        result = get_openai_response(prompt, cache=True, validate=validate)
+        if result:
+            record_route(intent[0])
+            finish_routed(budget, intent[0], prompt, result)
+            return parse_agent_result(prefix + result)
+    # langchain загружается только для открытых запросов
+    from .langchain_utils import use_ielts_agent
+    record_route(None)
+    return use_ielts_agent(input_text, history, budget)
+
+
+def stream_answer(input_text, history, budget=None):
+    # Те же события, что у stream_ielts_agent: action, token, result
+    intent = classify_intent(input_text)
+    if intent is not None:
+        prompt, prefix, validate = routed_request(*intent, input_text, history)
+        tool = "Mini Test" if intent[0] == "mini_test" else "Recommendation"
+        yield "action", {"tool": tool, "input": intent[1] or input_text, "log": "Routed directly without the agent"}
+        chunks = []
+        for chunk in stream_openai_response(prompt, cache=True, validate=validate):
+            chunks.append(chunk)
+            yield "token", chunk
+        if chunks:
+            record_route(intent[0])
+            finish_routed(budget, intent[0], prompt, "".join(chunks))
+            yield "result", parse_agent_result(prefix + "".join(chunks))
+            return
+    from .langchain_utils import stream_ielts_agent
+    record_route(None)
+    yield from stream_ielts_agent(input_text, history, budget)
+
+
+def parse_agent_result(result: str):
+    mini_test = None
+    listening_text = None
+    final_answer = result
+
+    if "Passage:" in result and "Questions:" in result:
+        mini_test = extract_mini_test(result)
+        final_answer = result.split("Passage:")[0].strip()
+
+    if "Listening Text:" in result:
+        listening_parts = result.split("Listening Text:")
+        listening_text = listening_parts[1].split("Questions:")[0].strip()
+        final_answer = listening_parts[0].strip()
+
+    return final_answer, mini_test, listening_text
+
+
+def extract_mini_test(result):
+    passage = result.split("Passage:")[1].split("Questions:")[0].strip()
+    questions_part = result.split("Questions:")[1].strip()
+
+    questions = []
+    for q in questions_part.split("\n\n"):
+        q_parts = q.split("\n")
+        question = {
+            "question": q_parts[0].strip(),
+            "options": [opt.strip() for opt in q_parts[1:]]
+        }
+        questions.append(question)
+
+    return {
+        "passage": passage,
+        "questions": questions
+    }
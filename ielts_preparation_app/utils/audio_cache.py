@@ -0,0 +1,163 @@
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Идентификатор аудио - sha256 от (model, voice, text) с расширением; другие имена не отдаются
+AUDIO_ID_PATTERN = re.compile(r"^([0-9a-f]{64})\.mp3$")
+# Файлы, которые оставляла прежняя версия generate_audio в рабочем каталоге
+LEGACY_PATTERN = "temp_audio_*.mp3"
+# Недописанные временные файлы старше этого возраста считаются брошенными
+TMP_MAX_AGE = 60 * 60
+
+
+class AudioCache:
+    def __init__(self, directory, max_bytes, ttl=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stopping = threading.Event()
+        os.makedirs(os.path.join(APP_ROOT, directory), exist_ok=True)
+
+    @staticmethod
+    def make_key(text, voice, model):
+        payload = "\0".join([model, voice, text]).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    @staticmethod
+    def audio_id(key):
+        return f"{key}.mp3"
+
+    @staticmethod
+    def parse_audio_id(audio_id):
+        match = AUDIO_ID_PATTERN.match(audio_id)
+        return match.group(1) if match else None
+
+    def relative_path(self, key):
+        # Путь относительно корня приложения - так его отдаёт маршрут /audio/
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def absolute_path(self, key):
+        return os.path.join(APP_ROOT, self.relative_path(key))
+
+    def get(self, key):
+        path = self.absolute_path(key)
+        try:
+            # Обновляем время доступа, чтобы вытеснение работало как LRU
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return self.relative_path(key)
+
+    def put(self, key, write_func):
+        path = self.absolute_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            write_func(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return self.relative_path(key)
+
+    def entries(self):
+        directory = os.path.join(APP_ROOT, self.directory)
+        result = []
+        for name in os.listdir(directory):
+            if not name.endswith(".mp3"):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            result.append((stat.st_mtime, stat.st_size, name))
+        return result
+
+    def evict(self):
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(APP_ROOT, self.directory, name))
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+
+    def sweep(self):
+        # Удаляет записи, к которым не обращались дольше ttl, брошенные временные файлы и старые temp_audio_*
+        now = time.time()
+        directory = os.path.join(APP_ROOT, self.directory)
+        expired = 0
+        if self.ttl:
+            for mtime, _, name in self.entries():
+                if now - mtime > self.ttl:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                        expired += 1
+                    except OSError:
+                        continue
+        stale = glob.glob(os.path.join(directory, "*.tmp"))
+        for root in {APP_ROOT, os.getcwd()}:
+            stale.extend(glob.glob(os.path.join(root, LEGACY_PATTERN)))
+        for path in stale:
+            try:
+                if now - os.path.getmtime(path) > TMP_MAX_AGE:
+                    os.remove(path)
+            except OSError:
+                continue
+        with self._lock:
+            self.expired += expired
+        self.evict()
+        return expired
+
+    def start_sweeper(self, interval):
+        if self._sweeper is not None:
+            return
+        self._stopping.clear()
+
+        def run():
+            while not self._stopping.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"An error occurred while sweeping the audio cache: {e}")
+
+        self.sweep()
+        self._sweeper = threading.Thread(target=run, name="audio-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stopping.set()
+        self._sweeper = None
+
+    def stats(self):
+        entries = self.entries()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
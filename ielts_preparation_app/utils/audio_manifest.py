@@ -0,0 +1,50 @@
+import json
+import os
+import threading
+
+from .audio_cache import APP_ROOT
+
+
+class AudioManifest:
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(APP_ROOT, directory, "manifest.json")
+        self._data = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"version": None, "entries": {}}
+
+    @property
+    def data(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self.load()
+        return self._data
+
+    def reload(self):
+        with self._lock:
+            self._data = self.load()
+
+    @property
+    def version(self):
+        return self.data.get("version")
+
+    def lookup(self, key):
+        return self.data["entries"].get(key)
+
+    def version_directory(self, version):
+        return os.path.join(self.directory, version)
+
+    def write(self, version, entries, **extra):
+        data = {"version": version, **extra, "entries": entries}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.reload()
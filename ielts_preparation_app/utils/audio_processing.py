@@ -0,0 +1,147 @@
+import io
+import logging
+import os
+import threading
+
+from .metrics import registry, count_error
+
+SAMPLE_RATE = 16000
+UPLOAD_FORMAT = os.getenv("AUDIO_UPLOAD_FORMAT", "mp3")
+UPLOAD_BITRATE = os.getenv("AUDIO_UPLOAD_BITRATE", "32k")
+MAX_SPEECH_SECONDS = int(os.getenv("MAX_SPEECH_SECONDS", 10 * 60))
+MIN_SPEECH_SECONDS = float(os.getenv("MIN_SPEECH_SECONDS", 0.5))
+# Тишина - всё, что тише среднего уровня записи на SILENCE_OFFSET_DB
+SILENCE_OFFSET_DB = 16
+# Сегменты для Whisper режутся по паузе не короче CHUNK_MIN_SILENCE_MS в последних
+# CHUNK_SEARCH_SECONDS перед целевой длиной, чтобы слово на границе не разрезалось
+CHUNK_SEARCH_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SEARCH_SECONDS", 10))
+CHUNK_MIN_SILENCE_MS = 300
+
+CONTENT_TYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "wav": "audio/wav", "flac": "audio/flac"}
+
+# Итоги по загрузкам - в get_audio_stats и метриках; в журнал попадают только сбои декодирования
+logger = logging.getLogger(__name__)
+
+audio_stats = {"uploads": 0, "unprocessed": 0, "original_bytes": 0, "processed_bytes": 0, "trimmed_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+class AudioRejected(ValueError):
+    # Запись без речи или слишком короткая - ошибка содержимого, а не размера
+    status = 422
+
+
+class AudioTooLong(AudioRejected):
+    status = 413
+
+
+def stream_size(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def decode_audio(stream):
+    # pydub использует ffmpeg; если его нет или формат не распознан, запись отправляется как есть
+    try:
+        from pydub import AudioSegment
+        return AudioSegment.from_file(stream)
+    except Exception as e:
+        count_error("audio_decode")
+        with _stats_lock:
+            audio_stats["unprocessed"] += 1
+        logger.warning("Could not decode audio, sending it unprocessed: %s", e)
+        return None
+    finally:
+        stream.seek(0)
+
+
+def normalize_audio(audio):
+    from pydub.silence import detect_leading_silence
+
+    audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE)
+    if audio.dBFS == float("-inf"):
+        raise AudioRejected("Recording contains no speech")
+    threshold = audio.dBFS - SILENCE_OFFSET_DB
+    start = detect_leading_silence(audio, silence_threshold=threshold)
+    end = len(audio) - detect_leading_silence(audio.reverse(), silence_threshold=threshold)
+    audio = audio[start:end] if end > start else audio[:0]
+    seconds = len(audio) / 1000
+    if seconds > MAX_SPEECH_SECONDS:
+        raise AudioTooLong(f"Recording is longer than {MAX_SPEECH_SECONDS} seconds")
+    if seconds < MIN_SPEECH_SECONDS:
+        raise AudioRejected("Recording contains no speech")
+    return audio
+
+
+def split_on_silence(audio, chunk_ms):
+    # Режет запись на куски не длиннее chunk_ms; граница - середина последней паузы перед chunk_ms,
+    # без паузы в окне поиска - ровно chunk_ms
+    from pydub.silence import detect_silence
+
+    threshold = audio.dBFS - SILENCE_OFFSET_DB
+    search_ms = int(min(CHUNK_SEARCH_SECONDS * 1000, chunk_ms // 2))
+    pieces = []
+    start = 0
+    while len(audio) - start > chunk_ms:
+        window_start = start + chunk_ms - search_ms
+        silences = detect_silence(audio[window_start:start + chunk_ms], min_silence_len=CHUNK_MIN_SILENCE_MS,
+                                  silence_thresh=threshold, seek_step=10)
+        if silences:
+            silence_start, silence_end = silences[-1]
+            end = window_start + (silence_start + silence_end) // 2
+        else:
+            end = start + chunk_ms
+        pieces.append(audio[start:end])
+        start = end
+    pieces.append(audio[start:])
+    return pieces
+
+
+def export_audio(audio):
+    buffer = io.BytesIO()
+    audio.export(buffer, format=UPLOAD_FORMAT, bitrate=UPLOAD_BITRATE)
+    buffer.seek(0)
+    return buffer
+
+
+def prepare_audio(stream, filename, content_type=None, chunk_seconds=0):
+    # Возвращает список сегментов (имя, поток, content_type), готовых к отправке в Whisper
+    original_size = stream_size(stream)
+    decoded = decode_audio(stream)
+    if decoded is None:
+        return [(filename, stream, content_type)]
+    audio = normalize_audio(decoded)
+
+    chunk_ms = chunk_seconds * 1000
+    pieces = split_on_silence(audio, chunk_ms) if chunk_ms else [audio]
+
+    base_name = os.path.splitext(filename)[0]
+    segments = []
+    for index, piece in enumerate(pieces):
+        suffix = f"_{index}" if len(pieces) > 1 else ""
+        segments.append((f"{base_name}{suffix}.{UPLOAD_FORMAT}", export_audio(piece), CONTENT_TYPES.get(UPLOAD_FORMAT)))
+
+    processed_size = sum(stream_size(segment[1]) for segment in segments)
+    trimmed_seconds = max(0.0, (len(decoded) - len(audio)) / 1000)
+    with _stats_lock:
+        audio_stats["uploads"] += 1
+        audio_stats["original_bytes"] += original_size
+        audio_stats["processed_bytes"] += processed_size
+        audio_stats["trimmed_seconds"] += trimmed_seconds
+    return segments
+
+
+def get_audio_stats():
+    with _stats_lock:
+        return {**audio_stats, "bytes_saved": audio_stats["original_bytes"] - audio_stats["processed_bytes"]}
+
+
+registry.callback("ielts_audio_uploads_total", "Speech uploads by preprocessing outcome.", "counter", ("outcome",),
+                  lambda: {("processed",): get_audio_stats()["uploads"], ("unprocessed",): get_audio_stats()["unprocessed"]})
+registry.callback("ielts_audio_preprocessing_bytes_total", "Speech upload bytes before and after preprocessing.",
+                  "counter", ("stage",),
+                  lambda: {("original",): get_audio_stats()["original_bytes"], ("processed",): get_audio_stats()["processed_bytes"]})
+registry.callback("ielts_audio_trimmed_seconds_total", "Silence trimmed from speech uploads.", "counter", (),
+                  lambda: {(): get_audio_stats()["trimmed_seconds"]})
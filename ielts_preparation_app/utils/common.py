@@ -1,8 +1,47 @@
+import json
 import os
 import random
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .audio_cache import APP_ROOT, AudioCache
+from .audio_manifest import AudioManifest
+from .openai_client import OpenAIClient, estimate_tokens
+from .metrics import track_call, record_usage, count_error, TTS_CHARACTERS, AUDIO_BYTES
+from .response_cache import create_response_cache
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_api = OpenAIClient(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    pool_size=int(os.getenv("OPENAI_POOL_SIZE", 40)),
+    timeout=float(os.getenv("OPENAI_TIMEOUT", 60)),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 3)),
+    requests_per_minute=int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 0)),
+    tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 0))
+)
+
+# Кэш ответов модели; используется только вызовами с cache=True
+response_cache = create_response_cache(
+    os.getenv("RESPONSE_CACHE_BACKEND", "memory"),
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", 24 * 60 * 60)),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+    path=os.getenv("RESPONSE_CACHE_PATH")
+)
+
+TTS_MODEL = "tts-1"
+
+audio_cache = AudioCache(
+    os.getenv("AUDIO_CACHE_DIR", "audio_cache"),
+    int(os.getenv("AUDIO_CACHE_MAX_BYTES", 200 * 1024 * 1024)),
+    ttl=int(os.getenv("AUDIO_CACHE_TTL", 7 * 24 * 60 * 60))
+)
+AUDIO_SWEEP_INTERVAL = int(os.getenv("AUDIO_SWEEP_INTERVAL", 10 * 60))
+
+# Аудио для статических тестов, заранее отрендеренное командой `flask prerender-audio`
+audio_manifest = AudioManifest(os.getenv("AUDIO_ASSETS_DIR", os.path.join("static", "audio")))
+
+# Общий пул ограничивает число одновременных запросов к TTS для всех тестов
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", 4))
+TTS_ITEM_TIMEOUT = float(os.getenv("TTS_ITEM_TIMEOUT", 30))
+
+tts_executor = ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS, thread_name_prefix="tts")
 
 WRITING_TOPICS = [
     "The advantages and disadvantages of living in a big city",
@@ -28,32 +67,147 @@ def get_random_topic(topic_type):
     else:
         return "Invalid topic type"
 
-def get_openai_response(prompt, model="gpt-4o-mini"):
+def is_json(result):
+    # Проверка ответа перед записью в кэш: неразобранный ответ не должен отдаваться из кэша повторно
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5,
-            max_tokens=1500
-        )
-        return response.choices[0].message.content
+        json.loads(result)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def parse_json_response(result):
+    if result:
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            count_error("llm_response_parse")
+            print("Error parsing the API response.")
+            return None
+    return None
+
+def cached_response(cache, model, temperature, max_tokens, prompt):
+    # Возвращает (ключ, ответ из кэша); ключ None, если вызов идёт без кэша
+    if not (cache and response_cache):
+        return None, None
+    cache_key = response_cache.make_key(model, temperature, max_tokens, prompt)
+    return cache_key, response_cache.get(cache_key)
+
+def store_response(cache_key, content, validate=None):
+    if cache_key and content and (validate is None or validate(content)):
+        response_cache.set(cache_key, content)
+
+def get_openai_response(prompt, model="gpt-4o-mini", temperature=0.5, max_tokens=1500, timeout=None, cache=False, validate=None):
+    cache_key, cached = cached_response(cache, model, temperature, max_tokens, prompt)
+    if cached is not None:
+        return cached
+    try:
+        with track_call("llm", "chat"):
+            response = openai_api.call(
+                lambda api: api.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                ),
+                tokens=estimate_tokens(prompt) + max_tokens,
+                timeout=timeout
+            )
+        record_usage(model, response.usage)
+        content = response.choices[0].message.content
+        store_response(cache_key, content, validate)
+        return content
     except Exception as e:
         print(f"An error occurred while accessing the OpenAI API: {e}")
         return None
 
-def generate_audio(text, voice="alloy"):
+def stream_openai_response(prompt, model="gpt-4o-mini", temperature=0.5, max_tokens=1500, timeout=None, cache=False, validate=None):
+    # Генератор фрагментов ответа по мере их поступления от модели
+    cache_key, cached = cached_response(cache, model, temperature, max_tokens, prompt)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
     try:
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
+        # Время считается до последнего фрагмента, а не до открытия потока
+        with track_call("llm", "chat_stream"):
+            stream = openai_api.call(
+                lambda api: api.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True
+                ),
+                tokens=estimate_tokens(prompt) + max_tokens,
+                timeout=timeout
+            )
+            for chunk in stream:
+                record_usage(model, getattr(chunk, "usage", None))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+    except Exception as e:
+        print(f"An error occurred while streaming from the OpenAI API: {e}")
+        return
+    store_response(cache_key, "".join(chunks), validate)
+
+def resolve_audio(audio_id):
+    # Клиент получает только идентификатор; путь на диске определяется здесь, произвольные пути не принимаются
+    key = audio_cache.parse_audio_id(audio_id)
+    if key is None:
+        return None
+    prerendered = audio_manifest.lookup(key)
+    if prerendered:
+        return os.path.join(APP_ROOT, prerendered)
+    path = audio_cache.absolute_path(key)
+    return path if os.path.exists(path) else None
+
+def synthesize_audio(text, path, voice="alloy", timeout=None):
+    TTS_CHARACTERS.inc(len(text), voice=voice)
+    with track_call("tts", "speech"):
+        response = openai_api.call(
+            lambda api: api.audio.speech.create(
+                model=TTS_MODEL,
+                voice=voice,
+                input=text
+            ),
+            timeout=timeout
         )
-        
-        # Сохраняем аудио во временный файл
-        temp_filename = f"temp_audio_{random.randint(1000, 9999)}.mp3"
-        response.stream_to_file(temp_filename)
-        
-        return temp_filename
+        response.stream_to_file(path)
+    AUDIO_BYTES.inc(os.path.getsize(path), direction="synthesized")
+
+def generate_audio(text, voice="alloy", timeout=None):
+    key = audio_cache.make_key(text, voice, TTS_MODEL)
+    if audio_manifest.lookup(key) or audio_cache.get(key):
+        return audio_cache.audio_id(key)
+    try:
+        # Сохраняем аудио в кэш, ключ - хэш от (text, voice, model)
+        audio_cache.put(key, lambda path: synthesize_audio(text, path, voice, timeout))
+        return audio_cache.audio_id(key)
     except Exception as e:
         print(f"An error occurred while generating audio: {e}")
         return None
+
+
+def iter_generate_audio(texts, voice="alloy", timeout=TTS_ITEM_TIMEOUT):
+    # Отдаёт пары (index, audio_file) по мере готовности каждого аудио.
+    # Пул общий для всех запросов, поэтому общего дедлайна у пачки нет: timeout каждого аудио
+    # отсчитывается дедлайном вызова OpenAI с момента, когда оно начало выполняться, а не стояло в очереди.
+    # Не уложившееся аудио возвращается как None из generate_audio
+    futures = {
+        tts_executor.submit(generate_audio, text, voice, timeout): index
+        for index, text in enumerate(texts)
+    }
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Клиент перестал читать - аудио, ещё стоящие в очереди, не генерируются
+        for future in futures:
+            future.cancel()
+
+def generate_audio_batch(texts, voice="alloy", timeout=TTS_ITEM_TIMEOUT):
+    results = [None] * len(texts)
+    for index, audio_file in iter_generate_audio(texts, voice, timeout):
+        results[index] = audio_file
+    return results
@@ -1,90 +1,119 @@
 import random
-from .common import get_openai_response, generate_audio
+from .common import get_openai_response, generate_audio_batch
 from .speaking import transcribe_audio
-import os
-
-DIAGNOSTIC_QUESTIONS = {
-    'listening': [
-        {"question": "What is the capital of France?", "options": ["London", "Berlin", "Paris", "Madrid"], "correct": "Paris"},
-        {"question": "Who wrote 'Romeo and Juliet'?", "options": ["Charles Dickens", "William Shakespeare", "Jane Austen", "Mark Twain"], "correct": "William Shakespeare"},
-    ],
-    'reading': [
-        {
-            "passage": "Climate change is a pressing global issue that affects every aspect of our lives. Rising temperatures, extreme weather events, and melting ice caps are just a few of the consequences we're facing. Scientists agree that human activities, particularly the burning of fossil fuels, are the main drivers of climate change. To mitigate its effects, we need to take urgent action on both individual and global scales.",
-            "questions": [
-                {"question": "What is the main idea of the passage?", "options": ["Economic growth", "Climate change", "Population growth", "Technological advancements"], "correct": "Climate change"},
-                {"question": "According to the passage, what is a consequence of climate change?", "options": ["Increased biodiversity", "Rising temperatures", "Economic prosperity", "Decreased pollution"], "correct": "Rising temperatures"},
-            ]
-        }
-    ],
-    'writing': [
-        {"task": "Write a short paragraph about your favorite hobby."},
-        {"task": "Describe the advantages and disadvantages of living in a big city."},
-    ],
-    'speaking': [
-        {"question": "Describe your favorite place to relax."},
-        {"question": "Talk about a person who has influenced you greatly."},
-    ]
-}
+from .question_bank import question_bank
+from .scoring import score_attempt
+from .adaptive import choose_adaptive_test, get_adaptive_test
+
+def choose_listening_questions():
+    # Возвращает id теста и копии вопросов (текст вопроса очищается ниже, ключ ответов не передаётся)
+    test_id = question_bank.choose('listening', 'diagnostic')
+    questions = question_bank.get(test_id)['questions']
+    return test_id, random.sample(questions, k=min(len(questions), 5))
+
+def choose_diagnostic_items(skill, k):
+    test_ids = question_bank.select(skill, 'diagnostic')
+    return [question_bank.get(test_id) for test_id in random.sample(test_ids, k=min(len(test_ids), k))]
+
+def attach_listening_audio(questions, audio_files):
+    for question, audio_file in zip(questions, audio_files):
+        if audio_file:
+            question['audio_url'] = audio_file
+            question['question'] = ''  # Remove the text question
+    return questions
 
 def get_diagnostic_test(skill):
     if skill == 'reading':
-        return random.choice(DIAGNOSTIC_QUESTIONS[skill])
+        return question_bank.get(question_bank.choose(skill, 'diagnostic'))
     elif skill == 'listening':
-        questions = random.sample(DIAGNOSTIC_QUESTIONS[skill], k=min(len(DIAGNOSTIC_QUESTIONS[skill]), 5))
-        for question in questions:
-            audio_file = generate_audio(question['question'])
-            if audio_file:
-                question['audio_url'] = audio_file
-                question['question'] = ''  # Remove the text question
-        return questions
+        test_id, questions = choose_listening_questions()
+        audio_files = generate_audio_batch([q['question'] for q in questions])
+        return {"id": test_id, "questions": attach_listening_audio(questions, audio_files)}
     elif skill == 'speaking':
-        return random.choice(DIAGNOSTIC_QUESTIONS[skill])
+        return question_bank.get(question_bank.choose(skill, 'diagnostic'))
     else:
-        return random.sample(DIAGNOSTIC_QUESTIONS[skill], k=min(len(DIAGNOSTIC_QUESTIONS[skill]), 5))
-
-def evaluate_diagnostic_test(skill, answers):
-    if skill == 'listening':
-        questions = get_diagnostic_test(skill)
-        correct = sum(1 for q, a in zip(questions, answers) if q['correct'] == a)
-        score = (correct / len(questions)) * 9  # Преобразуем в шкалу IELTS
-        return score
-    elif skill == 'reading':
-        correct = sum(1 for q, a in zip(DIAGNOSTIC_QUESTIONS[skill][0]['questions'], answers) if q['correct'] == a)
-        score = (correct / len(answers)) * 9  # Преобразуем в шкалу IELTS
-        return score
+        return choose_diagnostic_items(skill, 5)
+
+def adaptive_item(test_id, item_id):
+    test = question_bank.get(test_id)
+    question = next((q for q in test['questions'] if str(q['id']) == item_id), None) if test else None
+    if question is None:
+        return None
+    item = {"test_id": test_id, "question": question}
+    if 'passage' in test:
+        item['passage'] = test['passage']
+    return item
+
+def get_adaptive_item(skill, test_id, item_id):
+    # Аудио генерируется только для задания, которое действительно показывается
+    item = adaptive_item(test_id, item_id)
+    if item is not None and skill == 'listening':
+        attach_listening_audio([item['question']], generate_audio_batch([item['question']['question']]))
+    return item
+
+def start_adaptive_test(skill):
+    test_id = choose_adaptive_test(skill)
+    if test_id is None:
+        return None
+    engine = get_adaptive_test(test_id)
+    state = engine.start()
+    state['pending'] = engine.next_item(state)
+    return state
+
+def answer_adaptive_test(skill, state, item_id, answer):
+    # Возвращает результат шага: оценку способности и либо следующее задание, либо итоговый band
+    engine = get_adaptive_test(state['test_id'])
+    correct = question_bank.answer_key(state['test_id']).get(item_id) == answer
+    engine.update(state, item_id, correct)
+    theta, se = engine.estimate(state)
+    result = {"theta": round(theta, 3), "se": round(se, 3), "items_answered": len(state['administered'])}
+    if engine.finished(state):
+        state['pending'] = None
+        return {**result, "finished": True, "score": engine.band(skill, theta)}
+    state['pending'] = engine.next_item(state)
+    return {**result, "finished": False}
+
+def parse_score(result):
+    try:
+        score, explanation = result.split('\n', 1)
+        score_value = score.split(':')[1].strip()
+        # Удаляем все нецифровые символы, кроме точки
+        score_value = ''.join(char for char in score_value if char.isdigit() or char == '.')
+        return float(score_value)
+    except (ValueError, IndexError, AttributeError) as e:
+        print(f"Error parsing the score: {e}")
+        print(f"Original response: {result}")
+        return None
+
+def writing_evaluation_prompt(response):
+    return f"Evaluate the following writing response for IELTS proficiency. Provide a score from 1 to 9 and a brief explanation.\n\nResponse: {response}"
+
+def speaking_evaluation_prompt(transcript):
+    return f"Evaluate the following IELTS speaking response transcript. Provide a score from 1 to 9 and a brief explanation.\n\nTranscript: {transcript}"
+
+def score_diagnostic(skill, answers, test_id=None, item_ids=None):
+    # Ответы приходят списком в порядке показанных вопросов; item_ids - id этих вопросов.
+    # Старые клиенты их не передают - тогда проверяем по первому тесту в порядке ключа
+    test_id = test_id or question_bank.select(skill, 'diagnostic')[0]
+    correct_answers = question_bank.answer_key(test_id)
+    if correct_answers is None:
+        return None
+    item_ids = [str(item_id) for item_id in item_ids or correct_answers]
+    result = score_attempt(test_id, dict(zip(item_ids, answers)), item_ids)
+    return result['band'] if result else None
+
+def evaluate_diagnostic_test(skill, answers, test_id=None, item_ids=None):
+    if skill in ('listening', 'reading'):
+        return score_diagnostic(skill, answers, test_id, item_ids)
     elif skill == 'writing':
-        prompt = f"Evaluate the following writing response for IELTS proficiency. Provide a score from 1 to 9 and a brief explanation.\n\nResponse: {answers[0]}"
-        result = get_openai_response(prompt)
-        try:
-            score, explanation = result.split('\n', 1)
-            score_value = score.split(':')[1].strip()
-            # Удаляем все нецифровые символы, кроме точки
-            score_value = ''.join(char for char in score_value if char.isdigit() or char == '.')
-            return float(score_value)
-        except (ValueError, IndexError) as e:
-            print(f"Error parsing the score: {e}")
-            print(f"Original response: {result}")
-            return None
+        return parse_score(get_openai_response(writing_evaluation_prompt(answers[0])))
     elif skill == 'speaking':
         audio_file = answers[0]
         transcript = transcribe_audio(audio_file)
         if not transcript:
             print("Failed to transcribe audio")
             return None
-        
-        prompt = f"Evaluate the following IELTS speaking response transcript. Provide a score from 1 to 9 and a brief explanation.\n\nTranscript: {transcript}"
-        result = get_openai_response(prompt)
-        try:
-            score, explanation = result.split('\n', 1)
-            score_value = score.split(':')[1].strip()
-            # Удаляем все нецифровые символы, кроме точки
-            score_value = ''.join(char for char in score_value if char.isdigit() or char == '.')
-            return float(score_value)
-        except (ValueError, IndexError) as e:
-            print(f"Error parsing the score: {e}")
-            print(f"Original response: {result}")
-            return None
+        return parse_score(get_openai_response(speaking_evaluation_prompt(transcript)))
 
 def identify_strengths_weaknesses(results):
     strengths = [skill for skill, score in results.items() if isinstance(score, (int, float)) and score >= 6.5]
@@ -122,11 +151,3 @@ def get_skill_advice(skill):
         'speaking': "Improve fluency by speaking English regularly and expanding your vocabulary."
     }
     return advice.get(skill, "Practice this skill regularly to improve.")
-
-def cleanup_audio_files(questions):
-    for question in questions:
-        if 'audio_url' in question:
-            try:
-                os.remove(question['audio_url'])
-            except:
-                pass
@@ -0,0 +1,134 @@
+import math
+import os
+import re
+from functools import lru_cache
+
+# Минимальный объём по заданию IELTS: 150 слов для Task 1 и 250 для Task 2
+TASK_MIN_WORDS = {1: 150, 2: 250}
+# Эссе короче этого порога оцениваются локально, без обращения к модели
+ESSAY_MIN_WORDS = int(os.getenv("ESSAY_MIN_WORDS", 50))
+# Доля уникальных слов, ниже которой текст считается повтором одной фразы
+MIN_LEXICAL_DIVERSITY = 0.15
+# Доля ключевых слов темы, ниже которой эссе считается написанным не на тему
+ESSAY_MIN_TOPIC_OVERLAP = float(os.getenv("ESSAY_MIN_TOPIC_OVERLAP", 0.1))
+NOT_ASSESSED = "Not assessed: the response is too short or repetitive to evaluate."
+
+WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+SENTENCE_RE = re.compile(r"[^.!?]+")
+
+CONNECTIVES = (
+    "however", "moreover", "furthermore", "therefore", "consequently", "nevertheless", "nonetheless",
+    "although", "whereas", "meanwhile", "additionally", "similarly", "hence", "thus", "firstly",
+    "secondly", "finally", "overall", "in addition", "on the other hand", "for example", "for instance",
+    "as a result", "in contrast", "in conclusion", "to sum up", "in summary", "on the contrary",
+    "due to", "because of", "such as", "in other words",
+)
+SINGLE_CONNECTIVES = frozenset(c for c in CONNECTIVES if " " not in c)
+# Фразы ищутся как подстроки текста, собранного из слов через пробел, - это быстрее регулярного выражения
+PHRASE_CONNECTIVES = tuple(f" {c} " for c in CONNECTIVES if " " in c)
+
+STOPWORDS = frozenset(
+    "a an the of in on at to for from by with and or but is are was were be been being it its this that "
+    "these those as your you their they them our we his her how what which who whom why when where "
+    "do does did can could should would will shall may might must not no nor so than too very some any "
+    "all each other such own same about into over under between".split()
+)
+
+
+def normalize_word(word):
+    # Грубое приведение к основе, чтобы "cities" и "city", "working" и "work" совпадали
+    for suffix in ("ies", "ing", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def task_number(task_type):
+    # task_type приходит из формы строкой, из API - числом; всё, кроме 1, считается Task 2
+    return 1 if str(task_type).strip() == "1" else 2
+
+
+@lru_cache(maxsize=1024)
+def topic_keywords(topic):
+    return frozenset(normalize_word(word) for word in WORD_RE.findall(topic.lower()) if word not in STOPWORDS)
+
+
+def extract_features(essay, topic, task_type=2):
+    # Только регулярные выражения и операции над множествами: тысячи эссе в секунду на одном ядре
+    text = essay.lower()
+    words = WORD_RE.findall(text)
+    unique_words = set(words)
+    sentence_lengths = [n for n in (len(sentence.split()) for sentence in SENTENCE_RE.findall(text)) if n]
+    joined = f" {' '.join(words)} "
+    connectives = [word for word in words if word in SINGLE_CONNECTIVES]
+    connectives += [phrase for phrase in PHRASE_CONNECTIVES for _ in range(joined.count(phrase))]
+    keywords = topic_keywords(topic)
+    essay_stems = {normalize_word(word) for word in unique_words - STOPWORDS}
+    mean_length = sum(sentence_lengths) / len(sentence_lengths) if sentence_lengths else 0.0
+    stdev_length = math.sqrt(sum((n - mean_length) ** 2 for n in sentence_lengths) / len(sentence_lengths)) if sentence_lengths else 0.0
+    return {
+        "word_count": len(words),
+        "min_words": TASK_MIN_WORDS[task_number(task_type)],
+        "unique_words": len(unique_words),
+        "lexical_diversity": round(len(unique_words) / len(words), 3) if words else 0.0,
+        "sentence_count": len(sentence_lengths),
+        "avg_sentence_length": round(mean_length, 1),
+        "sentence_length_stdev": round(stdev_length, 1),
+        "connectives": len(connectives),
+        "connective_types": len(set(connectives)),
+        "topic_overlap": round(len(keywords & essay_stems) / len(keywords), 2) if keywords else None,
+    }
+
+
+def prescreen_band(features):
+    # (band, причина, комментарий о теме) для эссе, которые не имеет смысла отправлять модели; None - эссе нужно оценить полностью
+    word_count = features["word_count"]
+    if word_count == 0:
+        return 0, "The essay is empty.", NOT_ASSESSED
+    if word_count <= 20:
+        return 1, f"The essay has only {word_count} words; responses of 20 words or fewer are rated Band 1.", NOT_ASSESSED
+    if word_count < ESSAY_MIN_WORDS:
+        return 2, f"The essay has only {word_count} words, far below the {features['min_words']}-word minimum for this task.", NOT_ASSESSED
+    if features["lexical_diversity"] < MIN_LEXICAL_DIVERSITY:
+        return 2, "The essay mostly repeats the same words and cannot be assessed as a written response.", NOT_ASSESSED
+    overlap = features["topic_overlap"]
+    if overlap is not None and overlap < ESSAY_MIN_TOPIC_OVERLAP:
+        # Ответ, не связанный с заданием, по шкале IELTS получает Band 1 за Task Achievement
+        return 1, "The essay does not address the given topic.", (
+            f"Off topic: the essay uses {overlap:.0%} of the topic keywords."
+        )
+    return None
+
+
+def prescreen_result(features):
+    prescreened = prescreen_band(features)
+    if prescreened is None:
+        return None
+    band, reason, topic_relevance = prescreened
+    return {
+        "scores": {
+            "task_achievement": band,
+            "coherence_and_cohesion": band,
+            "lexical_resource": band,
+            "grammatical_range_and_accuracy": band,
+            "overall": band,
+        },
+        "improvements": [],
+        "recommendations": f"{reason} Write a complete response of at least {features['min_words']} words that addresses every part of the task.",
+        "topic_relevance": topic_relevance,
+        "features": features,
+        "prescreened": True,
+    }
+
+
+def describe_features(features):
+    lines = [
+        f"- Word count: {features['word_count']} (minimum for this task: {features['min_words']})",
+        f"- Lexical diversity (unique/total words): {features['lexical_diversity']}",
+        f"- Sentences: {features['sentence_count']}, average length {features['avg_sentence_length']} words "
+        f"(standard deviation {features['sentence_length_stdev']})",
+        f"- Linking words: {features['connectives']} ({features['connective_types']} different)",
+    ]
+    if features["topic_overlap"] is not None:
+        lines.append(f"- Share of topic keywords used in the essay: {features['topic_overlap']}")
+    return "\n".join(lines)
@@ -0,0 +1,42 @@
+import os
+import re
+import subprocess
+import sys
+
+from .audio_cache import APP_ROOT
+
+# Строка вывода `python -X importtime`: "import time: <self us> | <cumulative us> | <отступ><модуль>"
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+
+def measure_imports(module="main"):
+    # Замер в отдельном интерпретаторе: в текущем процессе модули уже загружены
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_ROOT, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(indent) - 1) // 2,
+            })
+    return entries
+
+
+def summarize_imports(entries, module="main"):
+    # Время по пакетам верхнего уровня (сумма собственного времени модулей) и общее время импорта модуля
+    packages = {}
+    for entry in entries:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + entry["self_ms"]
+    total = next((entry["cumulative_ms"] for entry in entries if entry["module"] == module and entry["depth"] == 0), 0.0)
+    return total, sorted(packages.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .metrics import JOB_SECONDS, count_error, log_timing
+
+# Меньшее значение - более высокий приоритет
+PRIORITY_DIAGNOSTIC = 0
+PRIORITY_PRACTICE = 10
+
+FINISHED_STATUSES = ("done", "failed")
+
+# Ошибки SQLite (например, "database is locked") не останавливают поток: он ждёт и пробует снова
+MAX_BACKOFF = 30.0
+FINISH_RETRIES = 5
+
+
+class JobQueue:
+    def __init__(self, path, workers=4, poll_interval=1.0, retention=24 * 60 * 60):
+        self.path = path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.handlers = {}
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        self._threads = []
+        self._stopping = threading.Event()
+        # Задачи, которые выполняет этот процесс, - при остановке невыполненные возвращаются в очередь
+        self._running = set()
+        self._running_lock = threading.Lock()
+        # Владелец задач в таблице; задаётся в start(), то есть уже в процессе воркера после fork
+        self.owner = None
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                blob BLOB,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at);
+        """)
+        columns = [row[1] for row in self._connection().execute("PRAGMA table_info(jobs)")]
+        if "owner" not in columns:
+            self._connection().execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self.close_connection()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def close_connection(self):
+        # Соединения SQLite не должны переживать fork: gunicorn с preload создаёт объекты в мастер-процессе
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def submit(self, kind, payload, blob=None, priority=PRIORITY_PRACTICE):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, kind, priority, status, payload, blob, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, priority, json.dumps(payload), blob, now, now)
+        )
+        with self._changed:
+            self._changed.notify_all()
+        return job_id
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            "SELECT id, kind, status, result, error, created_at, updated_at, "
+            "(SELECT COUNT(*) FROM jobs AS q WHERE q.status = 'queued' AND "
+            "(q.priority < jobs.priority OR (q.priority = jobs.priority AND q.created_at < jobs.created_at))) "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+        if row[2] == "queued":
+            job["position"] = row[7]
+        if row[3] is not None:
+            job["result"] = json.loads(row[3])
+        if row[4] is not None:
+            job["error"] = row[4]
+        return job
+
+    def counts(self):
+        # Число задач по типу и статусу - для /metrics
+        rows = self._connection().execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status")
+        return {(kind, status): count for kind, status, count in rows}
+
+    def wait(self, job_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _claim(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, blob FROM jobs WHERE status = 'queued' "
+                "ORDER BY priority, created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, updated_at = ? WHERE id = ?",
+                    (self.owner, time.time(), row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Входные данные (например, аудио) после завершения больше не нужны.
+        # Результат записывается, только если задача всё ещё за этим процессом: возвращённую в очередь
+        # при остановке задачу уже мог взять другой воркер
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, blob = NULL, updated_at = ? "
+            "WHERE id = ? AND status = 'running' AND owner = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, self.owner)
+        )
+        with self._changed:
+            self._changed.notify_all()
+
+    def _backoff(self, attempt, operation, error):
+        count_error("job")
+        delay = min(self.poll_interval * 2 ** attempt, MAX_BACKOFF)
+        print(f"Job queue {operation} failed ({error}), retrying in {delay:.1f}s")
+        return delay
+
+    def _store_result(self, job_id, status, result=None, error=None):
+        for attempt in range(FINISH_RETRIES + 1):
+            try:
+                self._finish(job_id, status, result, error)
+                return True
+            except sqlite3.Error as e:
+                if attempt == FINISH_RETRIES:
+                    # Задача остаётся в статусе running и вернётся в очередь при следующем recover()
+                    print(f"Giving up on saving the result of job {job_id}: {e}")
+                    return False
+                time.sleep(self._backoff(attempt, "finish", e))
+
+    def _work(self):
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                row = self._claim()
+                failures = 0
+            except sqlite3.Error as e:
+                self._stopping.wait(self._backoff(failures, "claim", e))
+                failures += 1
+                continue
+            if row is None:
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            job_id, kind, payload, blob = row
+            with self._running_lock:
+                self._running.add(job_id)
+            started = time.perf_counter()
+            result = None
+            error = None
+            try:
+                result = self.handlers[kind](json.loads(payload), blob)
+                if result is None:
+                    error = f"Failed to process {kind} job"
+            except Exception as e:
+                count_error("job")
+                print(f"An error occurred while processing job {job_id}: {e}")
+                error = str(e)
+            status = "done" if error is None else "failed"
+            self._store_result(job_id, status, result, error)
+            with self._running_lock:
+                self._running.discard(job_id)
+            elapsed = time.perf_counter() - started
+            JOB_SECONDS.observe(elapsed, kind=kind, status=status)
+            log_timing("job", elapsed, kind=kind, job_id=job_id, status=status)
+
+    def recover(self):
+        # Задачи, прерванные перезапуском, возвращаются в очередь; старые результаты удаляются.
+        # При нескольких процессах вызывается один раз до их запуска, иначе чужие задачи попадут в очередь повторно
+        conn = self._connection()
+        conn.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running'")
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - self.retention,)
+        )
+        self.close_connection()
+
+    def start(self, recover=True):
+        if self._threads:
+            return
+        if recover:
+            self.recover()
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def alive(self):
+        return bool(self._threads) and all(thread.is_alive() for thread in self._threads)
+
+    def drain(self):
+        # Потоки дорабатывают текущие задачи и не берут новые; дождаться их - stop()
+        self._stopping.set()
+
+    def stop(self, timeout=None):
+        self.drain()
+        with self._changed:
+            self._changed.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        # Задачи этого процесса, не успевшие завершиться за timeout, подхватит другой процесс. Владелец
+        # сбрасывается, поэтому результат, который поток запишет позже, будет отброшен в _finish
+        with self._running_lock:
+            unfinished = list(self._running)
+        requeued = []
+        for job_id in unfinished:
+            try:
+                cursor = self._connection().execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? "
+                    "WHERE id = ? AND status = 'running' AND owner = ?",
+                    (time.time(), job_id, self.owner)
+                )
+            except sqlite3.Error as e:
+                print(f"Could not requeue job {job_id}: {e}")
+                continue
+            if cursor.rowcount:
+                requeued.append(job_id)
+        return requeued
@@ -3,12 +3,113 @@ from langchain.prompts import StringPromptTemplate
 from langchain_community.llms import OpenAI
 from langchain.chains import LLMChain
 from langchain.tools import BaseTool
-from langchain.schema import AgentAction, AgentFinish
-from langchain.memory import ConversationBufferMemory
-from typing import List, Union, Any
+from langchain.schema import AgentAction, AgentFinish, OutputParserException
+from langchain.callbacks.base import BaseCallbackHandler
+from typing import List, Union
 import re
 import json
-from .common import get_openai_response
+import queue
+import threading
+import time
+from .common import get_openai_response, openai_api
+from .openai_client import DeadlineExceeded, estimate_tokens, retryable_errors
+from .agent_router import mini_test_prompt, recommendation_prompt, parse_agent_result, is_mini_test
+from .metrics import EXTERNAL_CALL_SECONDS, TOKENS, count_error, log_timing, track_call
+from .agent_budget import AgentBudget, AGENT_MAX_ITERATIONS, AGENT_MAX_SECONDS, current_budget, use_budget
+
+AGENT_MAX_TOKENS = 256
+
+# Вызовы LLM агента проходят через тот же лимитер запросов/токенов, что и остальное приложение.
+# Ожидание лимитера не выходит за остаток бюджета; DeadlineExceeded прерывает шаг агента
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    raise_error = True
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        budget = current_budget.get()
+        openai_api.limiter.acquire(
+            sum(estimate_tokens(p) for p in prompts) + AGENT_MAX_TOKENS,
+            max_wait=budget.remaining() if budget is not None else None
+        )
+
+def completion_tokens(response):
+    return sum(estimate_tokens(generation.text) for generations in response.generations for generation in generations)
+
+# Время вызовов LLM агента и его инструментов; langchain сообщает начало и конец каждого запуска с run_id
+class MetricsCallbackHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.started = {}
+        self.prompt_tokens = {}
+
+    def start(self, run_id, service, operation):
+        self.started[run_id] = (time.perf_counter(), service, operation)
+
+    def finish(self, run_id, outcome):
+        started, service, operation = self.started.pop(run_id, (None, None, None))
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        EXTERNAL_CALL_SECONDS.observe(elapsed, service=service, operation=operation, outcome=outcome)
+        if outcome == "error":
+            count_error(service)
+        log_timing("external_call", elapsed, service=service, operation=operation, outcome=outcome)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.prompt_tokens[run_id] = sum(estimate_tokens(p) for p in prompts)
+        self.start(run_id, "llm", "agent")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        # При потоковой генерации token_usage пуст, поэтому токены оцениваются по тексту, как в бюджете агента
+        usage = (response.llm_output or {}).get("token_usage", {})
+        model = (response.llm_output or {}).get("model_name", "agent")
+        prompt_tokens = self.prompt_tokens.pop(run_id, 0)
+        TOKENS.inc(usage.get("prompt_tokens") or prompt_tokens, model=model, kind="prompt")
+        TOKENS.inc(usage.get("completion_tokens") or completion_tokens(response), model=model, kind="completion")
+        self.finish(run_id, "ok")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.prompt_tokens.pop(run_id, None)
+        self.finish(run_id, "error")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.start(run_id, "agent_tool", serialized.get("name", "unknown"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.finish(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, "error")
+
+metrics_callback = MetricsCallbackHandler()
+
+# Расход бюджета запроса; при потоковой генерации модель не сообщает usage, поэтому токены оцениваются по тексту
+class BudgetCallbackHandler(BaseCallbackHandler):
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        budget = current_budget.get()
+        if budget is not None:
+            budget.add_step(sum(estimate_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, **kwargs):
+        budget = current_budget.get()
+        if budget is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage", {})
+        budget.add_tokens(usage.get("completion_tokens") or completion_tokens(response))
+
+budget_callback = BudgetCallbackHandler()
+
+# Пересылает токены и шаги агента (Thought/Action/Observation) в очередь для SSE
+class StreamingCallbackHandler(BaseCallbackHandler):
+    def __init__(self, events):
+        self.events = events
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.events.put(("token", token))
+
+    def on_agent_action(self, action, **kwargs):
+        self.events.put(("action", {"tool": action.tool, "input": action.tool_input, "log": action.log}))
+
+    def on_tool_end(self, output, **kwargs):
+        self.events.put(("observation", str(output)))
 
 # Инструменты для агента
 class WritingAnalysisTool(BaseTool):
@@ -50,8 +151,7 @@ class RecommendationTool(BaseTool):
     description: str = "Use this tool to get personalized recommendations"
 
     def _run(self, history: str) -> str:
-        prompt = f"Based on the following interaction history, provide a personalized IELTS study recommendation:\n\n{history}"
-        recommendation = get_openai_response(prompt)
+        recommendation = get_openai_response(recommendation_prompt(history), cache=True)
         return recommendation
 
 class MiniTestTool(BaseTool):
@@ -59,30 +159,7 @@ class MiniTestTool(BaseTool):
     description: str = "Use this tool to generate a mini test for practice"
 
     def _run(self, skill: str) -> str:
-        prompt = f"""Generate a short IELTS {skill} mini test with the following format:
-        1. A short passage or context (2-3 sentences)
-        2. 3 multiple-choice questions related to the passage
-        
-        Format the output as follows:
-        Passage: [Passage or context]
-        
-        Questions:
-        1. [Question 1]
-        a) [Option A]
-        b) [Option B]
-        c) [Option C]
-        
-        2. [Question 2]
-        a) [Option A]
-        b) [Option B]
-        c) [Option C]
-        
-        3. [Question 3]
-        a) [Option A]
-        b) [Option B]
-        c) [Option C]
-        """
-        test = get_openai_response(prompt)
+        test = get_openai_response(mini_test_prompt(skill), cache=True, validate=is_mini_test)
         return test
 
 # Создаем шаблон промпта для агента
@@ -128,6 +205,9 @@ class CustomPromptTemplate(StringPromptTemplate):
         kwargs["tools"] = "\n".join([f"{tool.name}: {tool.description}" for tool in self.tools])
         return self.template.format(**kwargs)
 
+FORMAT_REMINDER = "Invalid format. Reply with 'Action:' and 'Action Input:' lines, or with 'Final Answer:'."
+STOPPED_ANSWER = "I could not finish the answer within the time limit. Please try again or ask a more specific question."
+
 # Создаем парсер вывода агента
 class CustomOutputParser(AgentOutputParser):
     def parse(self, llm_output: str) -> Union[AgentAction, AgentFinish]:
@@ -138,43 +218,110 @@ class CustomOutputParser(AgentOutputParser):
             )
         match = re.search(r"Action: (.*?)[\n]*Action Input:[\s]*(.*)", llm_output, re.DOTALL)
         if not match:
-            raise ValueError(f"Could not parse LLM output: `{llm_output}`")
+            # Ответ без Action и Final Answer возвращается модели с напоминанием о формате и тратит один шаг бюджета
+            raise OutputParserException(
+                f"Could not parse LLM output: `{llm_output}`",
+                observation=FORMAT_REMINDER,
+                llm_output=llm_output,
+                send_to_llm=True
+            )
         action = match.group(1).strip()
         action_input = match.group(2)
         return AgentAction(tool=action, tool_input=action_input.strip(" ").strip('"'), log=llm_output)
 
+def best_partial_answer(intermediate_steps):
+    # Последний результат инструмента, иначе последний текст модели, который не удалось разобрать
+    for action, observation in reversed(intermediate_steps):
+        if action.tool != "_Exception" and observation:
+            return str(observation)
+    for action, observation in reversed(intermediate_steps):
+        text = re.sub(r"^\s*Thought:\s*", "", action.log).strip()
+        if text:
+            return text
+    return STOPPED_ANSWER
+
+def stopped_on_error(error, intermediate_steps):
+    # Вызов модели не уложился в остаток бюджета или упал: запрос завершается лучшим частичным ответом
+    budget = current_budget.get()
+    if budget is None or not isinstance(error, (DeadlineExceeded,) + retryable_errors()):
+        return None
+    from openai import APITimeoutError
+    budget.stop("time" if isinstance(error, (DeadlineExceeded, APITimeoutError)) else "llm_error")
+    print(f"Agent step failed ({error.__class__.__name__}), returning a partial answer")
+    return AgentFinish({"output": best_partial_answer(intermediate_steps)}, "")
+
+class IELTSAgent(LLMSingleActionAgent):
+    def plan(self, intermediate_steps, callbacks=None, **kwargs):
+        try:
+            return super().plan(intermediate_steps, callbacks, **kwargs)
+        except Exception as e:
+            finish = stopped_on_error(e, intermediate_steps)
+            if finish is None:
+                raise
+            return finish
+
+    def return_stopped_response(self, early_stopping_method, intermediate_steps, **kwargs):
+        # Сюда попадает и запуск, прерванный по max_execution_time
+        budget = current_budget.get()
+        if budget is not None:
+            budget.stop("time")
+        return AgentFinish({"output": best_partial_answer(intermediate_steps)}, "")
+
+class BoundedAgentExecutor(AgentExecutor):
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        budget = current_budget.get()
+        if budget is None:
+            return super()._should_continue(iterations, time_elapsed)
+        return budget.should_continue(iterations)
+
+class BoundedOpenAI(OpenAI):
+    @property
+    def _invocation_params(self):
+        # Таймаут вызова модели - не больше оставшегося времени бюджета запроса
+        params = super()._invocation_params
+        budget = current_budget.get()
+        if budget is not None:
+            params["timeout"] = max(min(self.request_timeout or budget.max_seconds, budget.remaining()), 0.1)
+        return params
+
 # Создаем агента
 def create_ielts_agent():
     tools = [
         Tool(
             name="Writing Analysis",
             func=WritingAnalysisTool()._run,
-            description="Use this tool to analyze IELTS writing tasks"
+            description="Use this tool to analyze IELTS writing tasks",
+            callbacks=[metrics_callback]
         ),
         Tool(
             name="Reading Analysis",
             func=ReadingAnalysisTool()._run,
-            description="Use this tool to analyze IELTS reading responses"
+            description="Use this tool to analyze IELTS reading responses",
+            callbacks=[metrics_callback]
         ),
         Tool(
             name="Listening Analysis",
             func=ListeningAnalysisTool()._run,
-            description="Use this tool to analyze IELTS listening responses"
+            description="Use this tool to analyze IELTS listening responses",
+            callbacks=[metrics_callback]
         ),
         Tool(
             name="Speaking Analysis",
             func=SpeakingAnalysisTool()._run,
-            description="Use this tool to analyze IELTS speaking responses"
+            description="Use this tool to analyze IELTS speaking responses",
+            callbacks=[metrics_callback]
         ),
         Tool(
             name="Recommendation",
             func=RecommendationTool()._run,
-            description="Use this tool to get personalized recommendations"
+            description="Use this tool to get personalized recommendations",
+            callbacks=[metrics_callback]
         ),
         Tool(
             name="Mini Test",
             func=MiniTestTool()._run,
-            description="Use this tool to generate a mini test for practice"
+            description="Use this tool to generate a mini test for practice",
+            callbacks=[metrics_callback]
         ),
     ]
 
@@ -186,55 +333,91 @@ def create_ielts_agent():
 
     output_parser = CustomOutputParser()
 
-    llm = OpenAI(temperature=0)
+    # Повтор внутри шага вышел бы за бюджет времени; неудачный шаг завершает запрос частичным ответом
+    llm = BoundedOpenAI(
+        temperature=0,
+        max_tokens=AGENT_MAX_TOKENS,
+        streaming=True,
+        request_timeout=openai_api.timeout,
+        max_retries=0,
+        callbacks=[RateLimitCallbackHandler(), metrics_callback, budget_callback]
+    )
     llm_chain = LLMChain(llm=llm, prompt=prompt)
 
-    agent = LLMSingleActionAgent(
+    agent = IELTSAgent(
         llm_chain=llm_chain,
         output_parser=output_parser,
         stop=["\nObservation:"],
         allowed_tools=[tool.name for tool in tools]
     )
 
-    memory = ConversationBufferMemory(memory_key="history")
-
-    agent_executor = AgentExecutor.from_agent_and_tools(agent=agent, tools=tools, verbose=True, memory=memory)
+    # Память не хранится в агенте: история диалога передаётся в каждом запросе
+    # Лимиты исполнителя действуют, если запрос идёт без бюджета; с бюджетом решает AgentBudget
+    agent_executor = BoundedAgentExecutor.from_agent_and_tools(
+        agent=agent,
+        tools=tools,
+        verbose=True,
+        max_iterations=AGENT_MAX_ITERATIONS,
+        max_execution_time=AGENT_MAX_SECONDS,
+        handle_parsing_errors=True
+    )
     return agent_executor
 
-# Функция для использования агента
-def use_ielts_agent(input_text: str, history: List[dict]):
-    agent = create_ielts_agent()
-    result = agent.run(input=input_text, history=json.dumps(history))
-    
-    mini_test = None
-    listening_text = None
-    final_answer = result
-
-    if "Passage:" in result and "Questions:" in result:
-        mini_test = extract_mini_test(result)
-        final_answer = result.split("Passage:")[0].strip()
-    
-    if "Listening Text:" in result:
-        listening_parts = result.split("Listening Text:")
-        listening_text = listening_parts[1].split("Questions:")[0].strip()
-        final_answer = listening_parts[0].strip()
-
-    return final_answer, mini_test, listening_text
-
-def extract_mini_test(result):
-    passage = result.split("Passage:")[1].split("Questions:")[0].strip()
-    questions_part = result.split("Questions:")[1].strip()
-    
-    questions = []
-    for q in questions_part.split("\n\n"):
-        q_parts = q.split("\n")
-        question = {
-            "question": q_parts[0].strip(),
-            "options": [opt.strip() for opt in q_parts[1:]]
+# Агент создаётся один раз на процесс и переиспользуется между запросами
+_agent_executor = None
+_agent_lock = threading.Lock()
+agent_stats = {"build_seconds": 0.0, "builds": 0, "reuses": 0}
+
+def get_ielts_agent():
+    global _agent_executor
+    with _agent_lock:
+        if _agent_executor is None:
+            started = time.perf_counter()
+            _agent_executor = create_ielts_agent()
+            agent_stats["build_seconds"] = time.perf_counter() - started
+            agent_stats["builds"] += 1
+        else:
+            agent_stats["reuses"] += 1
+        return _agent_executor
+
+def get_agent_stats():
+    with _agent_lock:
+        return {
+            **agent_stats,
+            "setup_seconds_saved": agent_stats["build_seconds"] * agent_stats["reuses"]
         }
-        questions.append(question)
-    
-    return {
-        "passage": passage,
-        "questions": questions
-    }
+
+# Функция для использования агента
+def use_ielts_agent(input_text: str, history: List[dict], budget: AgentBudget = None):
+    agent = get_ielts_agent()
+    with use_budget(budget or AgentBudget()), track_call("agent", "run"):
+        result = agent.run(input=input_text, history=json.dumps(history))
+    return parse_agent_result(result)
+
+def stream_ielts_agent(input_text: str, history: List[dict], budget: AgentBudget = None):
+    # Агент выполняется в отдельном потоке, события читаются из очереди по мере появления
+    events = queue.Queue()
+    finished = object()
+
+    def run():
+        try:
+            agent = get_ielts_agent()
+            with use_budget(budget or AgentBudget()), track_call("agent", "run_stream"):
+                result = agent.run(
+                    input=input_text,
+                    history=json.dumps(history),
+                    callbacks=[StreamingCallbackHandler(events)]
+                )
+            events.put(("result", parse_agent_result(result)))
+        except Exception as e:
+            print(f"An error occurred while running the agent: {e}")
+            events.put(("error", str(e)))
+        finally:
+            events.put(finished)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        event = events.get()
+        if event is finished:
+            return
+        yield event
@@ -0,0 +1,191 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Границы корзин гистограмм в секундах: от быстрых маршрутов до долгих ответов модели и агента
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# Структурированный лог времени: одна JSON-строка на запрос и на внешний вызов
+TIMING_LOG = os.getenv("TIMING_LOG", "0") == "1"
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Для каждого набора меток: счётчики по корзинам (последняя - +Inf), сумма и число наблюдений
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        labelnames = self.labelnames + ("le",)
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    result.append((f"{self.name}_bucket", labelnames, key + (format_value(bound),), cumulative))
+                result.append((f"{self.name}_sum", self.labelnames, key, total))
+                result.append((f"{self.name}_count", self.labelnames, key, count))
+        return result
+
+
+class CallbackMetric:
+    # Значения снимаются в момент опроса из существующей статистики (кэши, очередь) - без двойного учёта
+    def __init__(self, name, help_text, kind, labelnames, collect):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        try:
+            values = self.collect()
+        except Exception as e:
+            print(f"An error occurred while collecting metric {self.name}: {e}")
+            return []
+        return [(self.name, self.labelnames, key, value) for key, value in values.items()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, kind, labelnames, collect):
+        return self.register(CallbackMetric(name, help_text, kind, labelnames, collect))
+
+    def render(self):
+        # Текстовый формат экспозиции Prometheus 0.0.4
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, values, value in metric.samples():
+                lines.append(f"{name}{format_labels(labelnames, values)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "ielts_http_request_duration_seconds", "Time spent handling HTTP requests.", ("route", "method", "status")
+)
+EXTERNAL_CALL_SECONDS = registry.histogram(
+    "ielts_external_call_duration_seconds", "Time spent in calls to the LLM, TTS, Whisper and agent tools.",
+    ("service", "operation", "outcome")
+)
+TOKENS = registry.counter("ielts_llm_tokens_total", "Tokens reported by the OpenAI API.", ("model", "kind"))
+TTS_CHARACTERS = registry.counter("ielts_tts_characters_total", "Characters sent to text-to-speech.", ("voice",))
+AUDIO_BYTES = registry.counter(
+    "ielts_audio_bytes_total", "Audio bytes synthesized or sent for transcription.", ("direction",)
+)
+JOB_SECONDS = registry.histogram(
+    "ielts_job_duration_seconds", "Time spent processing background jobs.", ("kind", "status")
+)
+ERRORS = registry.counter("ielts_errors_total", "Errors that were handled and logged.", ("source",))
+
+
+def log_timing(event, seconds, **fields):
+    if TIMING_LOG:
+        print(json.dumps({"event": event, "duration_ms": round(seconds * 1000, 2), "ts": time.time(), **fields}))
+
+
+def count_error(source):
+    ERRORS.inc(source=source)
+
+
+@contextmanager
+def track_call(service, operation=""):
+    # Время внешнего вызова и его исход; исключение пробрасывается дальше без изменений
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        # Клиент закрыл поток или запрос отменён - это не ошибка сервиса
+        outcome = "cancelled"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        EXTERNAL_CALL_SECONDS.observe(elapsed, service=service, operation=operation, outcome=outcome)
+        if outcome == "error":
+            count_error(service)
+        log_timing("external_call", elapsed, service=service, operation=operation, outcome=outcome)
+
+
+def record_usage(model, usage):
+    if usage is None:
+        return
+    TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+    TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+
+# Пакет openai (вместе с httpx и pydantic-моделями) импортируется при первом обращении к API,
+# чтобы процесс начинал отвечать на маршруты без модели, не дожидаясь его загрузки
+_retryable_errors = None
+
+
+def retryable_errors():
+    global _retryable_errors
+    if _retryable_errors is None:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+        _retryable_errors = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+    return _retryable_errors
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0 if per_minute else 0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount, max_wait=None):
+        # Списывает amount сразу (допуская долг) и возвращает, сколько секунд нужно подождать.
+        # Если ждать пришлось бы дольше max_wait, ничего не списывается и возвращается None
+        if not self.capacity:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            remaining = self.tokens - min(amount, self.capacity)
+            wait = -remaining / self.rate if remaining < 0 else 0.0
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens = remaining
+            return wait
+
+    def refund(self, amount):
+        if not self.capacity:
+            return
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def reserve(self, tokens=0, max_wait=None):
+        request_wait = self.requests.reserve(1, max_wait)
+        if request_wait is None:
+            return None
+        token_wait = self.tokens.reserve(tokens, max_wait)
+        if token_wait is None:
+            self.requests.refund(1)
+            return None
+        return max(request_wait, token_wait)
+
+    def acquire(self, tokens=0, max_wait=None):
+        wait = self.reserve(tokens, max_wait)
+        if wait is None:
+            raise DeadlineExceeded("Rate limit wait exceeds the call deadline")
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def estimate_tokens(text):
+    # Грубая оценка: ~4 символа на токен
+    return len(text) // 4 + 1
+
+
+class OpenAIClient:
+    def __init__(self, api_key=None, pool_size=40, timeout=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, requests_per_minute=0, tokens_per_minute=0):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Синхронный клиент и его пул соединений создаются при первом вызове
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    self.http_client = httpx.Client(
+                        limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                        timeout=self.timeout,
+                    )
+                    # Повторы выполняет обёртка, поэтому встроенные повторы клиента отключены
+                    self._client = OpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0,
+                                          http_client=self.http_client)
+        return self._client
+
+    def retry_delay(self, error, attempt):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                if "retry-after-ms" in response.headers:
+                    retry_after = float(response.headers["retry-after-ms"]) / 1000
+                elif "retry-after" in response.headers:
+                    retry_after = float(response.headers["retry-after"])
+            except ValueError:
+                retry_after = None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, request, tokens=0, timeout=None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            # Ожидание лимитера входит в дедлайн; токены резервируются один раз, повтор занимает только слот запроса
+            self.limiter.acquire(tokens if attempt == 0 else 0, max_wait=max(deadline - time.monotonic(), 0))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("OpenAI call deadline exceeded")
+            try:
+                return request(self.client.with_options(timeout=remaining))
+            except Exception as e:
+                if not isinstance(e, retryable_errors()) or attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay(e, attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                print(f"OpenAI call failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
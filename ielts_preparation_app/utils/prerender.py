@@ -0,0 +1,75 @@
+import hashlib
+import os
+import shutil
+
+from .audio_cache import APP_ROOT
+from .common import audio_cache, audio_manifest, synthesize_audio, tts_executor, TTS_MODEL
+from .question_bank import question_bank
+
+
+def collect_static_texts():
+    texts = []
+    for test_id in question_bank.select('listening'):
+        texts.extend(question['text'] for question in question_bank.get(test_id)['questions'])
+    for test_id in question_bank.select('listening', 'diagnostic'):
+        texts.extend(question['question'] for question in question_bank.get(test_id)['questions'])
+    # Сохраняем порядок, убирая повторы
+    return list(dict.fromkeys(texts))
+
+
+def compute_version(keys):
+    digest = hashlib.sha256("\n".join(sorted(keys)).encode("utf-8")).hexdigest()
+    return digest[:12]
+
+
+def render_clip(text, path, voice):
+    # Клип пишется во временный файл и переносится на место целиком: прерванный запуск не оставляет обрезанный mp3
+    tmp_path = f"{path}.tmp"
+    try:
+        synthesize_audio(text, tmp_path, voice)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prerender_audio(voice="alloy", prune=False, log=print):
+    texts = collect_static_texts()
+    keys = {audio_cache.make_key(text, voice, TTS_MODEL): text for text in texts}
+    version = compute_version(keys)
+    directory = audio_manifest.version_directory(version)
+    os.makedirs(os.path.join(APP_ROOT, directory), exist_ok=True)
+
+    entries = {}
+    futures = {}
+    for key, text in keys.items():
+        relative_path = os.path.join(directory, f"{key}.mp3")
+        entries[key] = relative_path
+        absolute_path = os.path.join(APP_ROOT, relative_path)
+        if os.path.exists(absolute_path):
+            continue
+        futures[key] = tts_executor.submit(render_clip, text, absolute_path, voice)
+
+    failed = []
+    for key, future in futures.items():
+        try:
+            future.result()
+            log(f"Rendered {entries[key]}")
+        except Exception as e:
+            log(f"Failed to render {keys[key]!r}: {e}")
+            failed.append(key)
+    if failed:
+        # Манифест не публикуется, пока не отрендерен весь контент
+        raise RuntimeError(f"{len(failed)} audio item(s) failed to render")
+
+    audio_manifest.write(version, entries, voice=voice, model=TTS_MODEL)
+    log(f"Manifest version {version}: {len(entries)} item(s), {len(futures)} rendered")
+
+    if prune:
+        root = os.path.join(APP_ROOT, audio_manifest.directory)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name != version and os.path.isdir(path):
+                shutil.rmtree(path)
+                log(f"Removed stale version {name}")
+    return version
@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import time
+
+SKILLS = ("listening", "reading", "writing", "speaking")
+
+# Ключ группировки для агрегатов: день или неделя (ISO-дата понедельника)
+BUCKETS = {
+    "day": "recorded_on",
+    "week": "date(recorded_on, '-' || ((CAST(strftime('%w', recorded_on) AS INTEGER) + 6) % 7) || ' days')",
+}
+
+
+class ProgressStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS progress (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                recorded_on TEXT NOT NULL,
+                listening REAL,
+                reading REAL,
+                writing REAL,
+                speaking REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS progress_user_date ON progress (user_id, recorded_on, id);
+        """)
+        self.close_connection()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def close_connection(self):
+        # Соединения SQLite не должны переживать fork: gunicorn с preload создаёт объекты в мастер-процессе
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add(self, user_id, recorded_on, results):
+        scores = [results.get(skill) if isinstance(results.get(skill), (int, float)) else None for skill in SKILLS]
+        self._connection().execute(
+            f"INSERT INTO progress (user_id, recorded_on, {', '.join(SKILLS)}, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, recorded_on, *scores, time.time())
+        )
+
+    def query(self, user_id, start=None, end=None, bucket=None, limit=100, cursor=None):
+        # Возвращает (точки, курсор следующей страницы); точки упорядочены по дате
+        conditions = ["user_id = ?"]
+        params = [user_id]
+        if start:
+            conditions.append("recorded_on >= ?")
+            params.append(start)
+        if end:
+            conditions.append("recorded_on <= ?")
+            params.append(end)
+        where = " AND ".join(conditions)
+
+        if bucket:
+            key = BUCKETS[bucket]
+            having = ""
+            if cursor:
+                having = "HAVING bucket > ?"
+                params.append(cursor)
+            averages = ", ".join(f"AVG({skill})" for skill in SKILLS)
+            sql = (f"SELECT {key} AS bucket, {averages} FROM progress WHERE {where} "
+                   f"GROUP BY bucket {having} ORDER BY bucket LIMIT ?")
+        else:
+            if cursor:
+                recorded_on, row_id = cursor.split(":")
+                where += " AND (recorded_on, id) > (?, ?)"
+                params.extend([recorded_on, int(row_id)])
+            sql = (f"SELECT recorded_on, {', '.join(SKILLS)}, id FROM progress WHERE {where} "
+                   f"ORDER BY recorded_on, id LIMIT ?")
+        params.append(limit + 1)
+        rows = self._connection().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = last[0] if bucket else f"{last[0]}:{last[-1]}"
+        points = []
+        for row in rows:
+            point = {"date": row[0]}
+            for skill, score in zip(SKILLS, row[1:1 + len(SKILLS)]):
+                point[skill] = round(score, 2) if score is not None else None
+            points.append(point)
+        return points, next_cursor
@@ -0,0 +1,139 @@
+import copy
+import json
+import os
+import random
+import threading
+from functools import lru_cache
+
+from .audio_cache import APP_ROOT
+
+# Поля теста, которые нужны только для индекса и не отдаются клиенту
+METADATA_FIELDS = ("skill", "section", "difficulty", "tags")
+
+
+class QuestionBank:
+    # Индекс (метаданные и ключи ответов) лежит в index.json; тексты, пассажи и варианты
+    # читаются из файлов тестов только при обращении к конкретному тесту
+    def __init__(self, directory, cache_size=256):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.tests_directory = os.path.join(directory, "tests")
+        self._indexes = None
+        self._lock = threading.Lock()
+        self._read_test = lru_cache(maxsize=cache_size)(self._read_test_file)
+
+    def scan(self):
+        entries = []
+        for name in sorted(os.listdir(self.tests_directory)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self.tests_directory, name), encoding="utf-8") as f:
+                test = json.load(f)
+            entries.append({
+                "id": test["id"],
+                "file": name,
+                "skill": test["skill"],
+                "section": test.get("section", "practice"),
+                "difficulty": test.get("difficulty"),
+                "tags": test.get("tags", []),
+                "answers": {str(q["id"]): q["answer"] for q in test.get("questions", []) if "answer" in q},
+                # Калиброванные параметры 3PL (a, b, c) для адаптивной диагностики
+                "items": {str(q["id"]): [q["irt"]["a"], q["irt"]["b"], q["irt"].get("c", 0.0)]
+                          for q in test.get("questions", []) if "irt" in q},
+            })
+        return entries
+
+    def write_index(self):
+        entries = self.scan()
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"tests": entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        self.reload()
+        return len(entries)
+
+    def load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return json.load(f)["tests"]
+        except (OSError, ValueError, KeyError):
+            print(f"Question bank index {self.index_path} is missing or invalid, scanning test files")
+            return self.scan()
+
+    def build_indexes(self, entries):
+        indexes = {"tests": {}, "section": {}, "difficulty": {}, "tag": {}}
+        for entry in entries:
+            section_key = (entry["skill"], entry["section"])
+            indexes["tests"][entry["id"]] = entry
+            indexes["section"].setdefault(section_key, []).append(entry["id"])
+            indexes["difficulty"].setdefault(section_key + (entry["difficulty"],), []).append(entry["id"])
+            for tag in entry["tags"]:
+                indexes["tag"].setdefault(section_key + (tag,), []).append(entry["id"])
+        return indexes
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            with self._lock:
+                if self._indexes is None:
+                    self._indexes = self.build_indexes(self.load_index())
+        return self._indexes
+
+    def reload(self):
+        with self._lock:
+            self._indexes = self.build_indexes(self.load_index())
+            self._read_test.cache_clear()
+
+    def select(self, skill, section="practice", difficulty=None, tag=None):
+        key = (skill, section)
+        if difficulty is not None and tag is not None:
+            tagged = set(self.indexes["tag"].get(key + (tag,), ()))
+            return [test_id for test_id in self.indexes["difficulty"].get(key + (difficulty,), ()) if test_id in tagged]
+        if difficulty is not None:
+            return self.indexes["difficulty"].get(key + (difficulty,), [])
+        if tag is not None:
+            return self.indexes["tag"].get(key + (tag,), [])
+        return self.indexes["section"].get(key, [])
+
+    def choose(self, skill, section="practice", difficulty=None, tag=None):
+        test_ids = self.select(skill, section, difficulty, tag)
+        return random.choice(test_ids) if test_ids else None
+
+    def _read_test_file(self, test_id):
+        with open(os.path.join(self.tests_directory, self.indexes["tests"][test_id]["file"]), encoding="utf-8") as f:
+            test = json.load(f)
+        for field in METADATA_FIELDS:
+            test.pop(field, None)
+        for question in test.get("questions", []):
+            question.pop("answer", None)
+            question.pop("irt", None)
+        return test
+
+    def preload(self):
+        # Индекс и файлы тестов читаются заранее, например в мастер-процессе gunicorn до запуска воркеров
+        for test_id in self.indexes["tests"]:
+            self._read_test(test_id)
+        return len(self.indexes["tests"])
+
+    def get(self, test_id):
+        # Копия, чтобы вызывающий код мог менять тест, не затрагивая кэш
+        if test_id not in self.indexes["tests"]:
+            return None
+        return copy.deepcopy(self._read_test(test_id))
+
+    def info(self, test_id):
+        return self.indexes["tests"].get(test_id)
+
+    def answer_key(self, test_id):
+        entry = self.info(test_id)
+        return entry["answers"] if entry else None
+
+    def item_parameters(self, test_id):
+        entry = self.info(test_id)
+        return entry.get("items") if entry else None
+
+
+question_bank = QuestionBank(
+    os.getenv("QUESTION_BANK_DIR", os.path.join(APP_ROOT, "question_bank")),
+    cache_size=int(os.getenv("QUESTION_BANK_CACHE_SIZE", 256))
+)
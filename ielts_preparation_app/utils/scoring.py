@@ -0,0 +1,106 @@
+import numpy as np
+
+from .question_bank import question_bank
+
+# Таблицы перевода первичного балла (из 40) в band для Listening и Academic Reading:
+# минимальный балл для каждого band по возрастанию
+BAND_TABLES = {
+    "listening": (
+        (1, 1.0), (2, 2.0), (4, 2.5), (6, 3.0), (8, 3.5), (10, 4.0), (13, 4.5), (16, 5.0),
+        (18, 5.5), (23, 6.0), (26, 6.5), (30, 7.0), (32, 7.5), (35, 8.0), (37, 8.5), (39, 9.0),
+    ),
+    "reading": (
+        (1, 1.0), (2, 2.0), (4, 2.5), (6, 3.0), (8, 3.5), (10, 4.0), (13, 4.5), (15, 5.0),
+        (19, 5.5), (23, 6.0), (27, 6.5), (30, 7.0), (33, 7.5), (35, 8.0), (37, 8.5), (39, 9.0),
+    ),
+}
+RAW_SCORE_MAX = 40
+
+_band_arrays = {
+    skill: (np.array([raw for raw, _ in table]), np.array([0.0] + [band for _, band in table]))
+    for skill, table in BAND_TABLES.items()
+}
+
+
+def raw_to_band(skill, raw_scores):
+    # Первичные баллы приводятся к шкале из 40 вопросов заранее; band ищется бинарным поиском по таблице
+    thresholds, bands = _band_arrays[skill]
+    return bands[np.searchsorted(thresholds, raw_scores, side="right")]
+
+
+def encode_attempts(answer_key, attempts):
+    # Строки - попытки, столбцы - вопросы ключа; маска отмечает вопросы, которые были в попытке
+    question_ids = list(answer_key)
+    positions = {question_id: index for index, question_id in enumerate(question_ids)}
+    given = np.zeros((len(attempts), len(question_ids)), dtype=object)
+    mask = np.zeros((len(attempts), len(question_ids)), dtype=bool)
+    for row, attempt in enumerate(attempts):
+        answers = {str(question_id): answer for question_id, answer in attempt.get("answers", {}).items()}
+        item_ids = attempt.get("item_ids") or question_ids
+        for question_id in item_ids:
+            column = positions.get(str(question_id))
+            if column is not None:
+                mask[row, column] = True
+                given[row, column] = answers.get(str(question_id))
+    expected = np.array([answer_key[question_id] for question_id in question_ids], dtype=object)
+    return given == expected, mask
+
+
+def score_attempts(test_id, attempts):
+    # Оценивает много попыток одного теста сразу; только ключ ответов, без обращений к модели и TTS
+    info = question_bank.info(test_id)
+    if info is None or not info["answers"]:
+        return None
+    matches, mask = encode_attempts(info["answers"], attempts)
+    scores = (matches & mask).sum(axis=1)
+    totals = mask.sum(axis=1)
+    percentages = np.divide(scores * 100.0, totals, out=np.zeros(len(attempts)), where=totals > 0)
+    bands = None
+    if info["skill"] in BAND_TABLES:
+        bands = raw_to_band(info["skill"], np.rint(percentages * RAW_SCORE_MAX / 100).astype(int))
+
+    results = []
+    for index in range(len(attempts)):
+        result = {
+            "score": int(scores[index]),
+            "total": int(totals[index]),
+            "percentage": float(percentages[index]),
+        }
+        if bands is not None:
+            result["band"] = float(bands[index])
+        results.append(result)
+    return results
+
+
+def score_attempt(test_id, answers, item_ids=None):
+    results = score_attempts(test_id, [{"answers": answers, "item_ids": item_ids}])
+    return results[0] if results else None
+
+
+def attempt_error(attempt):
+    # Описание ошибки в попытке или None; проверяется до сборки матриц, чтобы не падать внутри numpy
+    if not isinstance(attempt, dict):
+        return "attempt must be an object"
+    test_id = attempt.get("test_id")
+    if not isinstance(test_id, str) or question_bank.info(test_id) is None:
+        return f"Unknown test: {test_id}"
+    if not isinstance(attempt.get("answers"), dict):
+        return "answers must be an object"
+    item_ids = attempt.get("item_ids")
+    if item_ids is not None and (not isinstance(item_ids, list) or
+                                 not all(isinstance(item_id, (str, int)) for item_id in item_ids)):
+        return "item_ids must be a list of question ids"
+    return None
+
+
+def score_batch(attempts):
+    # Попытки группируются по тесту, каждая группа оценивается одной матричной операцией
+    groups = {}
+    for index, attempt in enumerate(attempts):
+        groups.setdefault(attempt.get("test_id"), []).append(index)
+    results = [None] * len(attempts)
+    for test_id, indices in groups.items():
+        scored = score_attempts(test_id, [attempts[index] for index in indices])
+        for position, index in enumerate(indices):
+            results[index] = scored[position] if scored else {"error": f"Unknown test: {test_id}"}
+    return results
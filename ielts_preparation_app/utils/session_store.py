@@ -0,0 +1,215 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionStore:
+    def __init__(self, path):
+        self._local = threading.local()
+        self.path = path
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._connection().execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        self.close_connection()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def close_connection(self):
+        # Соединения SQLite не должны переживать fork: gunicorn с preload создаёт объекты в мастер-процессе
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def get(self, sid):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, data, lifetime):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (sid, data, time.time() + lifetime)
+        )
+
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def purge_expired(self):
+        self._connection().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+
+class FileSessionStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, f"{sid}.json")
+
+    def get(self, sid):
+        try:
+            with open(self._path(sid), encoding="utf-8") as f:
+                expires_at, data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if expires_at > time.time() else None
+
+    def set(self, sid, data, lifetime):
+        path = self._path(sid)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([time.time() + lifetime, data], f)
+        os.replace(tmp_path, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and self.get(name[:-5]) is None:
+                self.delete(name[:-5])
+
+
+class CachedSessionStore:
+    # LRU-кэш в памяти перед постоянным хранилищем: чтение горячих сессий не обращается к диску
+    def __init__(self, backend, max_entries=1000):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(sid)
+                return entry[1]
+        data = self.backend.get(sid)
+        if data is not None:
+            self._remember(sid, data, 60)
+        return data
+
+    def set(self, sid, data, lifetime):
+        self.backend.set(sid, data, lifetime)
+        self._remember(sid, data, lifetime)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+        self.backend.delete(sid)
+
+    def purge_expired(self):
+        self.backend.purge_expired()
+
+    def _remember(self, sid, data, lifetime):
+        with self._lock:
+            self._entries[sid] = (time.time() + lifetime, data)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    # В cookie хранится только подписанный идентификатор сессии, данные - на сервере
+    def __init__(self, store, purge_interval=60 * 60):
+        self.store = store
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="server-side-session")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("utf-8")
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSideSession(json.loads(data), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def persist(self, app, session):
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        self.store.set(session.sid, json.dumps(dict(session)), lifetime)
+        session.modified = False
+        if time.time() - self._last_purge > self.purge_interval:
+            self._last_purge = time.time()
+            self.store.purge_expired()
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        name = self.get_cookie_name(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        # Неизменённая сессия не перезаписывается
+        if not session.modified:
+            return
+        self.persist(app, session)
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode("utf-8"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+
+def create_session_interface(backend, root_path, cache_size=1000):
+    if backend == "sqlite":
+        store = SQLiteSessionStore(os.getenv("SESSION_DB_PATH", os.path.join(root_path, "sessions.sqlite3")))
+    elif backend == "file":
+        store = FileSessionStore(os.getenv("SESSION_DIR", os.path.join(root_path, "sessions")))
+    elif backend == "cookie":
+        return None
+    else:
+        raise ValueError(f"Unknown session backend: {backend}")
+    if cache_size:
+        store = CachedSessionStore(store, cache_size)
+    return ServerSideSessionInterface(store)
@@ -1,29 +1,70 @@
-import json
+import io
 import os
-from .common import get_openai_response, client, get_random_topic
+from concurrent.futures import ThreadPoolExecutor
+from .common import get_openai_response, openai_api, get_random_topic, parse_json_response
+from .audio_processing import AudioRejected, prepare_audio
+from .metrics import track_call, AUDIO_BYTES
+
+# Whisper принимает файлы до 25 МБ
+TRANSCRIBE_MAX_BYTES = int(os.getenv("TRANSCRIBE_MAX_BYTES", 25 * 1024 * 1024))
+# Длинные записи режутся на фрагменты и распознаются параллельно; 0 - без нарезки
+TRANSCRIBE_CHUNK_SECONDS = int(os.getenv("TRANSCRIBE_CHUNK_SECONDS", 0))
+
+transcription_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TRANSCRIBE_MAX_WORKERS", 4)),
+    thread_name_prefix="whisper"
+)
+
+class AudioTooLarge(AudioRejected):
+    status = 413
+
+def open_upload(audio_file, max_bytes=None):
+    # Загрузка уже лежит в буфере werkzeug (в памяти или во временном файле) - передаём его как есть
+    max_bytes = max_bytes or TRANSCRIBE_MAX_BYTES
+    stream = audio_file.stream
+    try:
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        stream = io.BytesIO(stream.read(max_bytes + 1))
+        size = len(stream.getvalue())
+    if size > max_bytes:
+        raise AudioTooLarge(f"Audio file is larger than {max_bytes} bytes")
+    return stream
+
+def prepare_upload(audio_file):
+    stream = open_upload(audio_file)
+    # Запись приводится к 16 кГц моно без тишины по краям и сжимается перед отправкой
+    return prepare_audio(stream, audio_file.filename or "audio.wav", audio_file.content_type, TRANSCRIBE_CHUNK_SECONDS)
+
+def transcribe_stream(filename, stream, content_type=None):
+    def request(api):
+        # При повторной попытке поток читается заново с начала
+        stream.seek(0)
+        return api.audio.transcriptions.create(
+            model="whisper-1",
+            file=(filename, stream, content_type)
+        )
+    stream.seek(0, os.SEEK_END)
+    AUDIO_BYTES.inc(stream.tell(), direction="transcribed")
+    with track_call("whisper", "transcription"):
+        return openai_api.call(request).text
 
 def transcribe_audio(audio_file):
     try:
-        temp_filename = "temp_audio.wav"
-        audio_file.save(temp_filename)
-        
-        with open(temp_filename, "rb") as file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=file
-            )
-        
-        os.remove(temp_filename)
-        return transcript.text
+        segments = prepare_upload(audio_file)
+        if len(segments) == 1:
+            return transcribe_stream(*segments[0])
+        texts = transcription_executor.map(lambda segment: transcribe_stream(*segment), segments)
+        return " ".join(text.strip() for text in texts)
+    except AudioRejected:
+        raise
     except Exception as e:
         print(f"An error occurred during transcription: {e}")
         return None
 
-def analyze_speech(audio_file, topic):
-    transcript = transcribe_audio(audio_file)
-    if not transcript:
-        return None
-
+def create_speech_analysis_prompt(transcript, topic):
     prompt = f"""Analyze the following IELTS Speaking response based on the given topic and provide feedback. Response format:
 
 {{
@@ -51,14 +92,14 @@ Transcript:
 {transcript}
 '''
 """
-    result = get_openai_response(prompt)
-    if result:
-        try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            print("Error parsing the API response.")
-            return None
-    return None
+    return prompt
+
+def analyze_speech(audio_file, topic):
+    transcript = transcribe_audio(audio_file)
+    if not transcript:
+        return None
+    result = get_openai_response(create_speech_analysis_prompt(transcript, topic))
+    return parse_json_response(result)
 
 def get_speaking_topic(custom_topic=None):
     if custom_topic:
@@ -1,8 +1,15 @@
+import hashlib
 import json
-from .common import get_openai_response, get_random_topic
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .common import get_openai_response, stream_openai_response, get_random_topic, parse_json_response, is_json
+from .essay_features import extract_features, prescreen_result, describe_features, task_number
+from .metrics import count_error
 
-def create_analysis_prompt(essay, task_type, topic):
-    task_description = "Writing Task 1" if task_type == 1 else "Writing Task 2"
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 8))
+
+def create_analysis_prompt(essay, task_type, topic, features=None):
+    task_description = f"Writing Task {task_number(task_type)}"
     prompt = f"""You are an IELTS {task_description} examiner. Analyze the following essay based on the given topic and provide the response **only** in JSON format without any additional comments. Response format:
 
 {{
@@ -29,19 +36,120 @@ Essay:
 '''
 {essay}
 '''
+"""
+    if features:
+        prompt += f"""
+Measured essay statistics (computed automatically, use them as evidence):
+{describe_features(features)}
 """
     return prompt
 
+def essay_input_error(essay, task_type, topic):
+    # Описание ошибки во входных данных или None; task_type приходит из формы строкой, из API - числом
+    if not isinstance(essay, str) or not isinstance(topic, str):
+        return "essay and topic must be strings"
+    if isinstance(task_type, bool) or not isinstance(task_type, (str, int)):
+        return "task_type must be a string or a number"
+    return None
+
+def parse_json_lines(lines):
+    records = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number} is not valid JSON: {e}")
+    return records
+
+def prescreen_essay(essay, task_type, topic):
+    # Локальные признаки считаются до обращения к модели; вырожденные эссе получают оценку сразу.
+    # Возвращает номер задания (1 или 2), который дальше используется вместо исходного task_type
+    error = essay_input_error(essay, task_type, topic)
+    if error:
+        raise ValueError(error)
+    task_type = task_number(task_type)
+    features = extract_features(essay, topic, task_type)
+    return task_type, features, prescreen_result(features)
+
+def with_features(result, features):
+    if result is not None:
+        result["features"] = features
+    return result
+
 def analyze_essay(essay, task_type, topic):
-    prompt = create_analysis_prompt(essay, task_type, topic)
-    result = get_openai_response(prompt)
-    if result:
+    task_type, features, prescreened = prescreen_essay(essay, task_type, topic)
+    if prescreened:
+        return prescreened
+    prompt = create_analysis_prompt(essay, task_type, topic, features)
+    # Повторная отправка того же эссе (например, после обновления страницы) берётся из кэша
+    result = get_openai_response(prompt, cache=True, validate=is_json)
+    return with_features(parse_json_response(result), features)
+
+def stream_essay_analysis(essay, task_type, topic):
+    # Отдаёт ("token", text) по мере генерации и в конце ("result", dict) в том же формате, что analyze_essay
+    task_type, features, prescreened = prescreen_essay(essay, task_type, topic)
+    if prescreened:
+        yield "result", prescreened
+        return
+    prompt = create_analysis_prompt(essay, task_type, topic, features)
+    chunks = []
+    for chunk in stream_openai_response(prompt, cache=True, validate=is_json):
+        chunks.append(chunk)
+        yield "token", chunk
+    yield "result", with_features(parse_json_response("".join(chunks)), features)
+
+def essay_fingerprint(essay, task_type, topic):
+    normalized = [" ".join(essay.split()), str(task_type), " ".join(topic.split())]
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+def analyze_essays(records, max_workers=BATCH_MAX_WORKERS):
+    # Оценивает пачку эссе параллельно; результаты отдаются по мере готовности, ошибки - по каждому эссе отдельно
+    groups = {}
+    for index, record in enumerate(records):
+        item_id = record.get('id', index) if isinstance(record, dict) else index
         try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            print("Error parsing the API response.")
-            return None
-    return None
+            essay, task_type, topic = record['essay'], record['task_type'], record['topic']
+        except (KeyError, TypeError):
+            yield {"index": index, "id": item_id, "error": "Record must contain essay, task_type and topic"}
+            continue
+        error = essay_input_error(essay, task_type, topic)
+        if error:
+            yield {"index": index, "id": item_id, "error": error}
+            continue
+        try:
+            # Вырожденные эссе оцениваются сразу и не занимают пул
+            task_type, _, prescreened = prescreen_essay(essay, task_type, topic)
+            # Одинаковые эссе оцениваются один раз
+            fingerprint = None if prescreened else essay_fingerprint(essay, task_type, topic)
+        except Exception as e:
+            count_error("essay_batch")
+            print(f"An error occurred while preparing essay {item_id}: {e}")
+            yield {"index": index, "id": item_id, "error": str(e)}
+            continue
+        if prescreened:
+            yield {"index": index, "id": item_id, "result": prescreened}
+            continue
+        groups.setdefault(fingerprint, {"args": (essay, task_type, topic), "items": []})["items"].append((index, item_id))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, BATCH_MAX_WORKERS))) as executor:
+        futures = {executor.submit(analyze_essay, *group["args"]): group for group in groups.values()}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                error = None if result is not None else "Failed to analyze essay"
+            except Exception as e:
+                result, error = None, str(e)
+            for position, (index, item_id) in enumerate(futures[future]["items"]):
+                item = {"index": index, "id": item_id}
+                if error:
+                    item["error"] = error
+                else:
+                    item["result"] = result
+                if position > 0:
+                    item["deduplicated"] = True
+                yield item
 
 def get_writing_topic(custom_topic=None):
     if custom_topic: